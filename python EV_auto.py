@@ -2,18 +2,17 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-# Laden und Vorbereiten der Daten
-file_path = 'ElectricCarData_Norm_Sorted.xlsx'
-data = pd.read_excel(file_path)
+import darstellung
+import fahrzeuge
+import messung
 
-# Konvertierung von Strings in numerische Werte
-data['Range_km'] = data['Range'].str.replace(' km', '').astype(int)
-data['TopSpeed_kmh'] = data['TopSpeed'].str.replace(' km/h', '').astype(int)
-data['Accel_sec'] = data['Accel'].str.replace(' sec', '').astype(float)
-data['Efficiency_Wh_km'] = data['Efficiency'].str.replace(' Wh/km', '').astype(float)
-data['FastCharge_km/h'] = pd.to_numeric(data['FastCharge'].str.extract('(\d+)')[0], downcast='float', errors='coerce').fillna(0)
+# Laden und Vorbereiten der Daten (Einheitenspalten werden gemeinsam in 'fahrzeuge' umgewandelt)
+@messung.traced()
+def load_data():
+    return fahrzeuge.load_vehicles('specs')
 
 # Hinzufügen von Funktionen für die Visualisierung
+@messung.traced()
 def plot_powertrain_distribution(data):
     st.write("""
     Visualisierung der Verteilung von Fahrzeugantrieben.
@@ -26,6 +25,7 @@ def plot_powertrain_distribution(data):
     fig = px.bar(powertrain_count, x='Antriebssysteme', y='Anzahl der Fahrzeuge', title='Verteilung der Antriebssysteme')
     st.plotly_chart(fig)
 
+@messung.traced()
 def plot_body_style_pricing(data):
     st.write("""
     Visualisierung der durchschnittlichen Fahrzeugpreise nach Karosseriestil.
@@ -34,6 +34,7 @@ def plot_body_style_pricing(data):
     fig = px.bar(data.groupby('BodyStyle')['PriceEuro'].mean().reset_index(), x='BodyStyle', y='PriceEuro', title='Durchschnittspreise nach Karosseriestil')
     st.plotly_chart(fig)
 
+@messung.traced()
 def plot_price_vs_performance(data):
     st.write("""
     Der Graph zeigt, wie der Preis, die Beschleunigung, die Höchstgeschwindigkeit und die Reichweite in Fahrzeugen miteinander verbunden sind. 
@@ -45,15 +46,18 @@ def plot_price_vs_performance(data):
                     color_continuous_scale=['red', 'green'])  # Rot für negative Korrelation, Grün für positive
     st.plotly_chart(fig)
 
+@messung.traced()
 def plot_fast_charging_capabilities(data):
     st.write("""
     Analyse der Schnellladekapazität in Bezug auf die Reichweite des Fahrzeugs.
     Dieser Streudiagramm zeigt Fahrzeuge mit ihrer Reichweite und Ladekapazität und hebt Modelle hervor, 
     die schnelles Laden mit großer Reichweite bieten, was für die Langzeitpraktikabilität von Elektrofahrzeugen entscheidend ist.
     """)
-    fig = px.scatter(data, x='Range_km', y='FastCharge_km/h', color='Brand', hover_data=['Model'], title='Lademöglichkeiten im Vergleich zur Reichweite')
+    fig = px.scatter(data, x='Range_km', y='FastCharge_km/h', color='Brand', hover_data=['Model'], title='Lademöglichkeiten im Vergleich zur Reichweite',
+                     render_mode=darstellung.render_mode(len(data)))
     st.plotly_chart(fig)
 
+@messung.traced()
 def plot_top_models_by_feature(data, feature, top_n=10):
     st.write(f"Top {top_n} Modelle nach {feature}")
     # Für Beschleunigung möchten wir die niedrigsten Werte oben haben, für andere Merkmale die höchsten
@@ -63,10 +67,9 @@ def plot_top_models_by_feature(data, feature, top_n=10):
                  title=f"Top {top_n} Modelle nach {feature}")
     st.plotly_chart(fig)
 
-# Haupt-Streamlit-Anwendung
-def app():
-    st.title('Analyse der verfügbaren Elektrofahrzeuge auf dem Markt')
-
+# Fragment für die gewählte Analyse; ein Wechsel der Analyse zeichnet nur dieses Diagramm neu
+@st.fragment
+def show_analysis(data):
     # Hinzufügen einer Auswahl für Analysen
     analysis_options = {
         'Verteilung der Antriebssysteme': plot_powertrain_distribution,
@@ -81,8 +84,10 @@ def app():
     analysis_function = analysis_options[option]
     analysis_function(data)
 
-    st.title('Top-Modelle Elektrofahrzeuge nach Schlüsselfunktionen')
 
+# Fragment für die Top-Modelle; Auswahlfeld und Schieberegler wirken nur hier
+@st.fragment
+def show_top_models(data):
     feature_selection = st.selectbox('Wählen Sie eine Funktion aus:',
                                      ['Range_km', 'FastCharge_km/h', 'PriceEuro', 'Efficiency_Wh_km', 'Accel_sec'])
     
@@ -97,5 +102,15 @@ def app():
     plot_top_models_by_feature(data, feature_selection, top_n=top_n_selection)
 
 
+# Haupt-Streamlit-Anwendung
+def app():
+    data = load_data()
+    st.title('Analyse der verfügbaren Elektrofahrzeuge auf dem Markt')
+    show_analysis(data)
+
+    st.title('Top-Modelle Elektrofahrzeuge nach Schlüsselfunktionen')
+    show_top_models(data)
+
+
 if __name__ == '__main__':
     app()
@@ -0,0 +1,100 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+
+import daten
+import messung
+
+# Obergrenze für alle zwischengespeicherten Bilder zusammen (Bytes)
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# Auflösung der gerenderten Abbildungen
+DPI = 150
+
+_figures = OrderedDict()
+_cache_bytes = 0
+# pyplot ist nicht threadsicher; Aufbau und Rasterung laufen daher nacheinander
+_render_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+
+# Rastert eine matplotlib-Abbildung als PNG und schließt sie danach,
+# damit sich im pyplot-Zustand lang laufender Server keine Abbildungen ansammeln
+@messung.traced()
+def render_png(fig, dpi=DPI):
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+def _store(key, png):
+    global _cache_bytes
+    with _cache_lock:
+        if key in _figures:
+            return
+        _figures[key] = png
+        _cache_bytes += len(png)
+        while _cache_bytes > MAX_CACHE_BYTES and len(_figures) > 1:
+            _, evicted = _figures.popitem(last=False)
+            _cache_bytes -= len(evicted)
+
+
+def _lookup(key):
+    with _cache_lock:
+        png = _figures.get(key)
+        if png is not None:
+            _figures.move_to_end(key)
+        return png
+
+
+# Dateiname eines Bildes im Artefaktbündel (python vorberechnung.py)
+def figure_name(key):
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:24] + '.png'
+
+
+# Alle Bilder im Zwischenspeicher als Liste von (Schlüssel, PNG-Bytes)
+def cached_items():
+    with _cache_lock:
+        return list(_figures.items())
+
+
+def _bundle_png(key):
+    path = daten.bundle_file('abbildungen', figure_name(key))
+    if path is None:
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# PNG-Bytes der Abbildung, die plot_function(*data, **params) liefert.
+# Schlüssel sind Funktion, Datenstand (version) und Parameter; die Daten selbst werden
+# nur über die Version identifiziert. Gerastert wird also einmal pro Datenstand, bei einem
+# passenden Artefaktbündel gar nicht.
+def cached_figure(plot_function, version, *data, **params):
+    key = (f'{plot_function.__module__}.{plot_function.__qualname__}', version, tuple(sorted(params.items())))
+    png = _lookup(key)
+    if png is not None:
+        messung.cache_event('abbildungen.figure', True)
+        return png
+    with _render_lock:
+        png = _lookup(key)
+        if png is None:
+            # Vorab gerastertes Bild aus dem Artefaktbündel
+            png = _bundle_png(key)
+            if png is not None:
+                _store(key, png)
+        # Ein Bild aus dem Bündel (oder von einem anderen Thread gerade gerastert) ist ein Treffer;
+        # als Fehlschlag zählt nur ein neues Rastern
+        messung.cache_event('abbildungen.figure', png is not None)
+        if png is None:
+            with messung.span('abbildungen.plot', function=key[0]):
+                fig = plot_function(*data, **params)
+            png = render_png(fig)
+            _store(key, png)
+    return png
@@ -0,0 +1,126 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import daten
+import messung
+
+# Schlüsselspalten der IEA-Tabellen im Langformat, in Sortierreihenfolge
+KEY_COLUMNS = daten.KEY_COLUMNS
+
+
+# Abfrageobjekt über einer nach den Schlüsselspalten sortierten Tabelle.
+# Für jedes Präfix der Schlüssel (z. B. parameter, region) ist der zusammenhängende
+# Zeilenbereich gespeichert, so dass eine Abfrage nur den Ausschnitt selbst anfasst.
+class IEAQuery:
+    def __init__(self, data, keys=KEY_COLUMNS):
+        self.keys = list(keys)
+        if pd.MultiIndex.from_frame(data[self.keys]).is_monotonic_increasing:
+            # Bereits sortierte (z. B. speicherabgebildete) Daten werden nicht kopiert
+            self.data = data.copy(deep=False)
+            self.data.index = pd.RangeIndex(len(data))
+        else:
+            self.data = data.sort_values(self.keys, kind='stable').reset_index(drop=True)
+        self._ranges = [self._prefix_ranges(depth) for depth in range(1, len(self.keys))]
+        self._last_values = self.data[self.keys[-1]].to_numpy()
+
+    def _prefix_ranges(self, depth):
+        n_rows = len(self.data)
+        if n_rows == 0:
+            return {}
+        changed = np.zeros(n_rows - 1, dtype=bool)
+        for key in self.keys[:depth]:
+            codes = pd.factorize(self.data[key])[0]
+            changed |= codes[1:] != codes[:-1]
+        starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+        stops = np.append(starts[1:], n_rows)
+        prefixes = zip(*(self.data[key].to_numpy()[starts] for key in self.keys[:depth]))
+        return {prefix: (start, stop) for prefix, start, stop in zip(prefixes, starts, stops)}
+
+    # Auswahl von Zeilen über die Schlüsselspalten, z. B.
+    # select(parameter='EV sales', region=['China', 'USA'], year=(2015, 2022)).
+    # Werte können Skalare oder Listen sein; für die letzte Schlüsselspalte ist ein
+    # Tupel (von, bis) ein geschlossener Bereich, None steht für eine offene Grenze.
+    def select(self, **criteria):
+        unknown = set(criteria) - set(self.keys)
+        if unknown:
+            raise KeyError(f'Keine Schlüsselspalte: {sorted(unknown)}')
+
+        # Längstes Präfix der Schlüssel, für das Werte angegeben wurden
+        prefix_values = []
+        for key in self.keys[:-1]:
+            if key not in criteria:
+                break
+            prefix_values.append(_as_list(criteria[key]))
+        depth = len(prefix_values)
+
+        if depth:
+            bounds = [self._ranges[depth - 1].get(prefix) for prefix in itertools.product(*prefix_values)]
+            bounds = [b for b in bounds if b is not None]
+        else:
+            bounds = [(0, len(self.data))]
+
+        last = self.keys[-1]
+        last_range = None
+        if depth == len(self.keys) - 1 and last in criteria and not _is_list(criteria[last]):
+            last_range = criteria[last] if isinstance(criteria[last], tuple) else (criteria[last], criteria[last])
+
+        parts = []
+        for start, stop in bounds:
+            if last_range is not None:
+                # Innerhalb eines vollständigen Präfixes ist die letzte Spalte sortiert
+                values = self._last_values[start:stop]
+                low, high = last_range
+                if high is not None:
+                    stop = start + np.searchsorted(values, high, side='right')
+                if low is not None:
+                    start = start + np.searchsorted(values, low, side='left')
+            parts.append(self.data.iloc[start:stop])
+
+        if not parts:
+            result = self.data.iloc[0:0]
+        elif len(parts) == 1:
+            result = parts[0]
+        else:
+            result = pd.concat(parts)
+
+        # Übrige Bedingungen werden nur noch auf dem Ausschnitt geprüft
+        for key, value in criteria.items():
+            if key in self.keys[:depth] or (key == last and last_range is not None):
+                continue
+            if isinstance(value, tuple) and key == last:
+                low, high = value
+                if low is not None:
+                    result = result[result[key] >= low]
+                if high is not None:
+                    result = result[result[key] <= high]
+            else:
+                result = result[result[key].isin(_as_list(value))]
+        return result
+
+
+def _is_list(value):
+    return isinstance(value, (list, set, np.ndarray, pd.Index, pd.Series))
+
+
+# Werte einer Bedingung als Liste; doppelte Werte nur einmal, sonst kämen Zeilen mehrfach zurück
+def _as_list(value):
+    return list(dict.fromkeys(value)) if _is_list(value) else [value]
+
+
+@messung.traced_cache(st.cache_resource)
+def _query_for(source_hash, _name, predicates=()):
+    if predicates:
+        return IEAQuery(daten.compact(daten.scan_iea(_name, **dict(predicates))))
+    return IEAQuery(daten.load_iea(_name))
+
+
+# Gemeinsames Abfrageobjekt für einen IEA-Datensatz; Dateien mit gleichem Inhalt teilen es.
+# Mit Bedingungen (z. B. parameter=['EV sales'], mode='Cars', year=(2010, None)) wird die
+# Quelldatei gestreamt gelesen und nur der passende Ausschnitt im kompakten Schema gehalten
+# (daten.scan_iea, daten.compact).
+def query_for(name, **predicates):
+    predicates = tuple(sorted((key, tuple(value) if isinstance(value, list) else value) for key, value in predicates.items()))
+    return _query_for(daten.content_hash(daten.IEA_DATEIEN[name]), name, predicates)
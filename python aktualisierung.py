@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+import daten
+
+# Partitionen, in denen neue IEA-Veröffentlichungen verglichen werden
+PARTITION_COLUMNS = ['region', 'year', 'parameter']
+
+# Spalten, deren Inhalt in den Fingerabdruck einer Partition eingeht
+CONTENT_COLUMNS = ['region', 'category', 'parameter', 'mode', 'powertrain', 'year', 'unit', 'value']
+
+
+# Geänderte Datensätze zwischen zwei Ständen {logischer Name: Inhalts-Hash};
+# neue und entfernte Datensätze zählen als geändert
+def changed_datasets(previous, current):
+    return sorted(name for name in set(previous) | set(current) if previous.get(name) != current.get(name))
+
+
+# Fingerabdruck je Partition: Summe der Zeilen-Hashes (modulo 2**64), damit die
+# Reihenfolge der Zeilen keine Rolle spielt, zusammen mit der Zeilenzahl
+def partition_fingerprints(data):
+    columns = [column for column in CONTENT_COLUMNS if column in data.columns]
+    hashes = pd.util.hash_pandas_object(data[columns], index=False)
+    groups = [data[column] for column in PARTITION_COLUMNS]
+    return pd.DataFrame({'hash': hashes.groupby(groups, sort=False).sum(),
+                         'rows': hashes.groupby(groups, sort=False).size()})
+
+
+# Schlüssel (region, year, parameter) aller Partitionen, die sich zwischen old und new
+# unterscheiden, einschließlich neu hinzugekommener und weggefallener Partitionen
+def changed_partitions(old, new):
+    old_prints = partition_fingerprints(old)
+    new_prints = partition_fingerprints(new)
+    joined = old_prints.join(new_prints, how='outer', lsuffix='_old', rsuffix='_new')
+    changed = (joined['hash_old'] != joined['hash_new']) | (joined['rows_old'] != joined['rows_new'])
+    return joined.index[changed.to_numpy()]
+
+
+# Zeilen einer Tabelle, die in den angegebenen Partitionen liegen
+def partition_rows(data, partitions):
+    if len(partitions) == 0:
+        return data.iloc[:0]
+    keys = pd.MultiIndex.from_frame(data[PARTITION_COLUMNS])
+    return data[keys.isin(partitions)]
+
+
+# Alte und neue Zeilen der geänderten Partitionen je geändertem Datensatz:
+# {Name: (alte Zeilen, neue Zeilen, Partitionen)}. None, wenn ein alter Stand nicht mehr
+# im Zwischenspeicher liegt; dann muss der Aufrufer vollständig neu aufbauen.
+def dataset_deltas(previous, current):
+    deltas = {}
+    for name in changed_datasets(previous, current):
+        old = _payload(previous.get(name))
+        new = _payload(current.get(name))
+        if old is None or new is None:
+            return None
+        partitions = changed_partitions(old, new)
+        deltas[name] = (partition_rows(old, partitions), partition_rows(new, partitions), partitions)
+    return deltas
+
+
+def _payload(source_hash):
+    if source_hash is None:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in daten.IEA_DTYPES.items()})
+    return daten.read_payload(source_hash)
+
+
+# Regionen mit geänderten Partitionen eines Parameters
+def changed_regions(partitions, parameter):
+    if len(partitions) == 0:
+        return []
+    frame = partitions.to_frame(index=False)
+    return sorted(frame.loc[frame['parameter'] == parameter, 'region'].unique())
+
+
+# Addiert die Spalten 'columns' einer Differenztabelle zu einer Aggregattabelle mit denselben
+# Schlüsseln; Schlüssel, die in base noch fehlen, werden angehängt
+def add_aggregates(base, delta, keys, columns):
+    positions = pd.MultiIndex.from_frame(base[keys]).get_indexer(pd.MultiIndex.from_frame(delta[keys]))
+    found = positions >= 0
+    result = base.copy()
+    for column in columns:
+        values = result[column].to_numpy(copy=True)
+        np.add.at(values, positions[found], delta[column].to_numpy()[found].astype(values.dtype))
+        result[column] = values
+    added = delta.loc[~found, keys + columns]
+    if len(added):
+        result = pd.concat([result, added], ignore_index=True)
+    return result
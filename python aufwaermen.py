@@ -0,0 +1,203 @@
+import http.server
+import importlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import daten
+import messung
+
+# Aufwärmen beim Serverstart ist eingeschaltet, solange EV_WARMUP nicht 0/false ist.
+# Ohne Aufwärmen laden die Seiten wie bisher bei Bedarf.
+ENABLED = os.environ.get('EV_WARMUP', '1').lower() not in ('0', 'false', 'no')
+
+# Threads für Lade- und Aufbauaufgaben (Ein-/Ausgabe, pandas, openpyxl)
+IO_WORKERS = int(os.environ.get('EV_WARMUP_THREADS', min(8, os.cpu_count() or 1)))
+
+# Optionaler HTTP-Port für die Bereitschaftsprüfung des Load Balancers (GET /ready: 200 oder 503)
+READY_PORT = os.environ.get('EV_READY_PORT')
+
+# Bereitschaftsstatus als Datei, z. B. für eine exec-Probe
+STATUS_FILE = os.path.join(daten.CACHE_DIR, 'bereitschaft.json')
+
+_lock = threading.Lock()
+_started = False
+_status = {'state': 'pending', 'started': None, 'finished': None, 'tasks': {}}
+
+
+def _call(module_name, function_name, *args):
+    return getattr(importlib.import_module(module_name), function_name)(*args)
+
+
+def _sale_forecasts(random_forest=False):
+    sale = importlib.import_module('sale')
+    return sale.load_forecasts(daten.content_hash(daten.IEA_DATEIEN['ev_history']), random_forest)
+
+
+def _sale_models():
+    sale = importlib.import_module('sale')
+    X, y = sale.prepare_data(sale.load_query())
+    sale.train_linear_model_and_predict(X, y)
+    sale.train_random_forest_and_predict(X, y)
+
+
+# Läuft im Prozesspool: trainiert die Modelle der Seite 'sale' und speichert sie auf der
+# Festplatte (prognose.MODEL_DIR), so dass der Serverprozess sie danach nur noch lädt
+def fit_sale_models():
+    _sale_models()
+    return os.getpid()
+
+
+# Ladeaufgaben: (Name, Funktion, Argumente). Abhängige Aufgaben warten über die Sperren der
+# Streamlit-Zwischenspeicher aufeinander, statt dieselben Daten doppelt zu laden.
+def io_tasks():
+    tasks = [(f'iea:{name}', _call, ('daten', 'load_iea', name)) for name in daten.IEA_DATEIEN]
+    tasks += [(f'fahrzeuge:{name}', _call, ('fahrzeuge', 'load_vehicles', name)) for name in daten.SPEC_DATEIEN]
+    tasks += [
+        ('woerterbuch', _call, ('daten', 'label_dictionary')),
+        ('wuerfel', _call, ('wuerfel', 'cube_query')),
+        ('sale:abfrage', _call, ('sale', 'load_query')),
+        ('sale:prognosen', _sale_forecasts, ()),
+        ('sale:prognosen_rf', _sale_forecasts, (True,)),
+        ('ladestation', _call, ('ladestation', 'load_country_query', daten.dataset_version(daten.IEA_DATEIEN))),
+        ('szenarien', _call, ('szenarien', 'load_engine')),
+        ('browser:filter', _call, ('browser', 'load_filter_engine')),
+        ('browser:empfehlungen', _call, ('browser', 'load_similarity_index')),
+    ]
+    return tasks
+
+
+# Modellaufgaben: (Name, Funktion im Prozesspool, Funktion im Serverprozess danach)
+def model_tasks():
+    return [('modelle:sale', fit_sale_models, _sale_models)]
+
+
+def _set_task(name, **values):
+    with _lock:
+        _status['tasks'].setdefault(name, {}).update(values)
+
+
+def _set_state(state, **values):
+    with _lock:
+        _status.update(state=state, **values)
+        snapshot = json.loads(json.dumps(_status))
+    try:
+        os.makedirs(daten.CACHE_DIR, exist_ok=True)
+        tmp_path = f'{STATUS_FILE}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, STATUS_FILE)
+    except OSError:
+        pass
+
+
+def _run_task(name, function, args):
+    _set_task(name, state='running')
+    start = time.perf_counter()
+    try:
+        with messung.span(f'aufwaermen.{name}'):
+            function(*args)
+    except Exception as error:
+        _set_task(name, state='failed', seconds=round(time.perf_counter() - start, 3), error=f'{type(error).__name__}: {error}')
+        return False
+    _set_task(name, state='done', seconds=round(time.perf_counter() - start, 3))
+    return True
+
+
+# Trainings- und Ladezeit stehen getrennt in fit_seconds und load_seconds, seconds ist die Summe
+def _run_model_task(name, process_pool, fit, load):
+    _set_task(name, state='running')
+    start = time.perf_counter()
+    try:
+        process_pool.submit(fit).result()
+    except Exception as error:
+        _set_task(name, state='failed', seconds=round(time.perf_counter() - start, 3), error=f'{type(error).__name__}: {error}')
+        return False
+    fit_seconds = time.perf_counter() - start
+    _set_task(name, state='fitted', fit_seconds=round(fit_seconds, 3), seconds=round(fit_seconds, 3))
+    # Gespeicherte Modelle in den Speicher des Serverprozesses holen
+    loaded = _run_task(name, load, ())
+    with _lock:
+        task = _status['tasks'][name]
+        task.update(load_seconds=task['seconds'], seconds=round(time.perf_counter() - start, 3))
+    return loaded
+
+
+# Alle Aufgaben gleichzeitig: Laden im Thread-Pool, Modelltraining im Prozesspool.
+# 'spawn' statt 'fork', weil der Serverprozess zu diesem Zeitpunkt bereits Threads hat.
+def run():
+    _set_state('running', started=time.time())
+    tasks = io_tasks()
+    models = model_tasks()
+    for name, *_ in tasks + models:
+        _set_task(name, state='pending')
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max(1, len(models)), mp_context=context) as process_pool, \
+            ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='aufwaermen') as thread_pool:
+        futures = [thread_pool.submit(_run_task, name, function, args) for name, function, args in tasks]
+        futures += [thread_pool.submit(_run_model_task, name, process_pool, fit, load) for name, fit, load in models]
+        results = [future.result() for future in futures]
+
+    # Auch bei einzelnen Fehlern ist der Server bereit; die Seiten laden Fehlendes bei Bedarf nach
+    _set_state('ready' if all(results) else 'degraded', finished=time.time())
+
+
+# Startet das Aufwärmen einmal pro Prozess in einem Hintergrund-Thread
+def start():
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    if READY_PORT:
+        _start_ready_server(int(READY_PORT))
+    if not ENABLED:
+        _set_state('disabled')
+        return
+    threading.Thread(target=run, name='aufwaermen', daemon=True).start()
+
+
+# Aktueller Status: state ist 'pending', 'running', 'ready', 'degraded' oder 'disabled'
+def status():
+    with _lock:
+        return json.loads(json.dumps(_status))
+
+
+# Bereit für Anfragen: Aufwärmen beendet (auch mit einzelnen Fehlern) oder abgeschaltet
+def is_ready():
+    return status()['state'] in ('ready', 'degraded', 'disabled')
+
+
+class _ReadyHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('/ready', '/status'):
+            self.send_error(404)
+            return
+        body = json.dumps(status()).encode()
+        self.send_response(200 if self.path.rstrip('/') == '/status' or is_ready() else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_ready_server(port):
+    try:
+        server = http.server.ThreadingHTTPServer(('0.0.0.0', port), _ReadyHandler)
+    except OSError:
+        # Port schon belegt (z. B. durch einen zweiten Prozess auf demselben Host)
+        return None
+    threading.Thread(target=server.serve_forever, name='bereitschaft', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    run()
+    print(json.dumps(status(), indent=2))
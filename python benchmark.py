@@ -0,0 +1,253 @@
+import argparse
+import functools
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import daten
+
+# Seiten, die der Benchmark headless ausführt
+PAGES = ['sale', 'energie', 'ladestation', 'EV_auto', 'browser', 'batterie']
+
+# Vielfache der mitgelieferten Datenmenge
+SCALES = [1, 10, 100, 1000]
+
+# Hilfsmodule, deren öffentliche Funktionen als Stufen gemessen werden
+STAGE_MODULES = ['daten', 'fahrzeuge', 'abfrage', 'wuerfel', 'prognose', 'trend', 'abbildungen', 'darstellung',
+                 'empfehlung', 'fahrzeugfilter', 'szenarien']
+
+# Pfad der Batteriedaten in batterie.app und Zeilenzahl der synthetischen Grundtabelle
+BATTERIE_DATEI = 'xxxxxxxx.xls'
+BATTERIE_ZEILEN = 250
+
+# Zeitlimit für einen Seitenaufruf (Sekunden)
+PAGE_TIMEOUT = 1800
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# IEA-Tabelle im Langformat, auf das scale-fache vergrößert: jede Kopie erhält eigene
+# Regionsnamen ('Europe 3', ...) und leicht verrauschte Werte
+def scale_iea(data, scale, rng):
+    copies = []
+    for k in range(scale):
+        copy = data.copy()
+        if k:
+            copy['region'] = copy['region'] + f' {k}'
+            copy['value'] = copy['value'] * rng.uniform(0.9, 1.1, len(copy))
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+# Fahrzeugtabelle, auf das scale-fache vergrößert: Kopien mit eigenem Modellnamen und Preis
+def scale_vehicles(data, scale, rng):
+    copies = []
+    for k in range(scale):
+        copy = data.copy()
+        if k:
+            copy['Model'] = copy['Model'].astype(str) + f' #{k}'
+            copy['PriceEuro'] = (copy['PriceEuro'] * rng.uniform(0.9, 1.1, len(copy))).round().astype('int64')
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+# Synthetische Batteriedaten im Format der Quelldatei von batterie.app
+def synthetic_batteries(rows, rng):
+    netto = rng.uniform(30, 110, rows)
+    dc = rng.uniform(40, 350, rows).round(1)
+    wltp = rng.uniform(13, 28, rows).round(1)
+    return pd.DataFrame({
+        'Fahrzeug': [f'Marke{i % 40} Modell {i}' for i in range(rows)],
+        'Ladeleist': [f'AC:11 kW / DC:{str(value).replace(".", ",")} kW' for value in dc],
+        'WLTP_komb': [f'{str(value).replace(".", ",")} kWh/100 km' for value in wltp],
+        'Reichw_E_wert': (netto * rng.uniform(4, 7, rows)).round().astype('int64'),
+        'AntriebsbatterieKapazitaetNettoKwh': netto,
+        'AntriebsbatterieKapazitaetBruttoKwh': netto * rng.uniform(1.02, 1.1, rows),
+        'LeistungKW': rng.integers(60, 600, rows),
+    })
+
+
+# Legt die Quelldateien aller Seiten in der Größe scale unter directory an.
+# Vorhandene Daten werden wiederverwendet (Markierungsdatei 'rows.json').
+def generate_data(directory, scale, seed=0):
+    marker = os.path.join(directory, 'rows.json')
+    if os.path.exists(marker):
+        with open(marker, encoding='utf-8') as f:
+            return json.load(f)
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    rows = {}
+    # Quelldateien mit identischem Inhalt werden einmal erzeugt und dann kopiert, damit sie
+    # auch vergrößert identisch bleiben (gemeinsamer Datenbestand je Inhalts-Hash in daten)
+    generated = {}
+    for name, path in daten.IEA_DATEIEN.items():
+        source_hash = daten.file_hash(os.path.join(REPO_DIR, path))
+        if source_hash in generated:
+            shutil.copyfile(os.path.join(directory, generated[source_hash][0]), os.path.join(directory, path))
+            rows[name] = generated[source_hash][1]
+            continue
+        data = scale_iea(daten.read_iea_csv(os.path.join(REPO_DIR, path)), scale, rng)
+        data.to_csv(os.path.join(directory, path), index=False)
+        rows[name] = len(data)
+        generated[source_hash] = (path, len(data))
+    for name, path in daten.SPEC_DATEIEN.items():
+        data = scale_vehicles(pd.read_excel(os.path.join(REPO_DIR, path)), scale, rng)
+        data.to_excel(os.path.join(directory, path), index=False)
+        rows[name] = len(data)
+    data = synthetic_batteries(BATTERIE_ZEILEN * scale, rng)
+    data.to_excel(os.path.join(directory, BATTERIE_DATEI), index=False, engine='openpyxl')
+    rows['batterie'] = len(data)
+
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump(rows, f)
+    return rows
+
+
+# Misst alle Aufrufe einer Funktion (Anzahl und Gesamtzeit, verschachtelte Aufrufe inklusive)
+def _timed(name, function, stages):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stage = stages[name]
+            stage['calls'] += 1
+            stage['total_s'] += time.perf_counter() - start
+    return wrapper
+
+
+# Ersetzt die Funktionen der Seite und die öffentlichen Funktionen der Hilfsmodule
+# durch messende Hüllen. Die Seiten rufen sie über die Modulattribute auf.
+def instrument(page, stages):
+    for module_name in [page] + STAGE_MODULES:
+        module = importlib.import_module(module_name)
+        for attribute, value in list(vars(module).items()):
+            if not callable(value) or isinstance(value, type):
+                continue
+            if getattr(value, '__module__', None) != module_name:
+                continue
+            if module_name != page and attribute.startswith('_'):
+                continue
+            setattr(module, attribute, _timed(f'{module_name}.{attribute}', value, stages))
+
+
+def _peak_rss_mb():
+    # ru_maxrss ist unter Linux in KiB, unter macOS in Bytes angegeben
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_once(app_test, stages):
+    stages.clear()
+    start = time.perf_counter()
+    app_test.run()
+    wall = time.perf_counter() - start
+    return {
+        'wall_s': round(wall, 4),
+        'errors': [str(exception.value) for exception in app_test.exception],
+        'stages': {name: {'calls': stage['calls'], 'total_s': round(stage['total_s'], 4)}
+                   for name, stage in sorted(stages.items(), key=lambda item: -item[1]['total_s'])},
+    }
+
+
+# Führt eine Seite im aktuellen Arbeitsverzeichnis aus: ein kalter Lauf (leerer
+# Zwischenspeicher) und ein warmer Lauf derselben Sitzung
+def run_page(page):
+    from streamlit.testing.v1 import AppTest
+
+    shutil.rmtree(daten.CACHE_DIR, ignore_errors=True)
+    stages = defaultdict(lambda: {'calls': 0, 'total_s': 0.0})
+    baseline = _peak_rss_mb()
+    instrument(page, stages)
+
+    app_test = AppTest.from_string(f'import {page}\n{page}.app()\n', default_timeout=PAGE_TIMEOUT)
+    cold = _run_once(app_test, stages)
+    warm = _run_once(app_test, stages)
+    return {
+        'cold': cold,
+        'warm': warm,
+        'baseline_rss_mb': round(baseline, 1),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'status': 'error' if cold['errors'] or warm['errors'] else 'ok',
+    }
+
+
+# Jede Kombination aus Seite und Größe läuft in einem eigenen Prozess,
+# damit Spitzenspeicher und Zwischenspeicher der Läufe unabhängig sind
+def run_worker(page, directory):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', page]
+    try:
+        completed = subprocess.run(command, cwd=directory, capture_output=True, text=True, timeout=PAGE_TIMEOUT * 2)
+    except subprocess.TimeoutExpired:
+        return {'status': 'timeout'}
+    if completed.returncode != 0 or not completed.stdout.strip():
+        return {'status': 'failed', 'stderr': completed.stderr[-4000:]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(pages=PAGES, scales=SCALES, data_dir=None, seed=0, log=print):
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), 'ev-benchmark')
+    results = []
+    for scale in scales:
+        directory = os.path.join(data_dir, f'x{scale}')
+        start = time.perf_counter()
+        rows = generate_data(directory, scale, seed)
+        log(f'Daten x{scale}: {sum(rows.values())} Zeilen ({time.perf_counter() - start:.1f} s)')
+        for page in pages:
+            result = run_worker(page, directory)
+            results.append({'page': page, 'scale': scale, 'rows': rows, **result})
+            wall = result.get('cold', {}).get('wall_s')
+            log(f'  {page} x{scale}: {result["status"]}, kalt {wall} s, Spitze {result.get("peak_rss_mb")} MB')
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pages': list(pages),
+            'scales': list(scales),
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless-Benchmark der Streamlit-Seiten mit synthetischen Daten')
+    parser.add_argument('--pages', nargs='+', default=PAGES, choices=PAGES)
+    parser.add_argument('--scales', nargs='+', type=int, default=SCALES)
+    parser.add_argument('--data-dir', help='Verzeichnis für die synthetischen Daten (wird wiederverwendet)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON-Ergebnisdatei (Standard: Ausgabe auf stdout)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_page(args.worker)))
+        return
+
+    log = (lambda message: print(message, file=sys.stderr))
+    report = run_benchmark(args.pages, args.scales, args.data_dir, args.seed, log)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,47 +2,31 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+import darstellung
+import empfehlung
+import fahrzeuge
+import fahrzeugfilter
+import messung
 
-# Laden der Daten
-data = pd.read_excel("ElectricCarData_Norm_SortedII.xlsx")
-# Umwandeln der 'Reichweite'-Spalte von String in numerischen Wert
-data['Range'] = data['Range'].str.replace(' km', '').astype(int)
+# Laden der Daten (die Reichweite steht als Zahl in 'Range_km')
+@messung.traced()
+def load_data():
+    return fahrzeuge.load_vehicles('specs_ii')
 
-def app():
-    st.title('Der Elektroauto-Browser')
-
-    # Hinzufügen von Filtern
-    price_filter = st.sidebar.slider('Filtern nach Preis (Euro):', int(data['PriceEuro'].min()), int(data['PriceEuro'].max()), (int(data['PriceEuro'].min()), int(data['PriceEuro'].max())))
-    range_filter = st.sidebar.slider('Filtern nach Reichweite (km):', 0, int(data['Range'].max()), (0, int(data['Range'].max())))
-    seats_filter = st.sidebar.slider('Filtern nach Anzahl der Sitze:', int(data['Seats'].min()), int(data['Seats'].max()), (int(data['Seats'].min()), int(data['Seats'].max())))
-    body_style = st.sidebar.multiselect('Wählen Sie den Karosseriestil:', options=data['BodyStyle'].unique())
-    power_train = st.sidebar.multiselect('Wählen Sie den Antrieb:', options=data['PowerTrain'].unique())
-    rapid_charge = st.sidebar.checkbox('Schnellladung möglich?')
+# Filter mit sortierten Indizes für die Schieberegler und Wertelisten für die Auswahlfelder
+@messung.traced_cache(st.cache_resource)
+def load_filter_engine():
+    return fahrzeugfilter.FilterEngine(load_data(), range_columns=['PriceEuro', 'Range_km', 'Seats'],
+                                       category_columns=['BodyStyle', 'PowerTrain', 'RapidCharge'])
 
-    # Filtern der Daten
-    data_filtered = data[(data['PriceEuro'] >= price_filter[0]) & (data['PriceEuro'] <= price_filter[1]) &
-                         (data['Range'] >= range_filter[0]) &
-                         (data['Range'] <= range_filter[1]) &
-                         (data['Seats'] >= seats_filter[0]) & (data['Seats'] <= seats_filter[1])]
-    if body_style:
-        data_filtered = data_filtered[data_filtered['BodyStyle'].isin(body_style)]
-    if power_train:
-        data_filtered = data_filtered[data_filtered['PowerTrain'].isin(power_train)]
-    if rapid_charge:
-        data_filtered = data_filtered[data_filtered['RapidCharge'] == 'Rapid charging possible']
-
-    search_clicked = st.sidebar.button('Search')
-
-    if search_clicked:
-        # Anzeige der gefilterten Daten
-        st.write(f"Gefundene Fahrzeuge: {len(data_filtered)}")
-        st.dataframe(data_filtered)
-
-    # Interaktive Visualisierung der Daten mit Plotly
-    if not data_filtered.empty:
-        fig = px.scatter(data_filtered, x='PriceEuro', y='Range', color='Brand', hover_data=['Model'], title="Interaktiver Scatter Plot: Preis vs. Reichweite")
-        st.plotly_chart(fig)
+# Ähnlichkeitsindex für die Empfehlungen (einmal pro Prozess aufgebaut)
+@messung.traced_cache(st.cache_resource)
+def load_similarity_index():
+    return empfehlung.SimilarityIndex(load_filter_engine().data)
 
+# Fragment für Detailansicht und Empfehlungen; Filter und Streudiagramm bleiben unberührt
+@st.fragment
+def show_model_details(data, data_filtered):
     # Initialisierung der Variablen model_selection
     model_selection = 'Bitte wählen'
     
@@ -59,16 +43,52 @@ def app():
     # Hinzufügen von personalisierten Empfehlungen
     if model_selection != 'Bitte wählen':
         st.subheader('Empfohlene Modelle:')
-        similar_models = data[(data['Range'] <= selected_model_details['Range'].iloc[0] + 50) & 
-                              (data['Range'] >= selected_model_details['Range'].iloc[0] - 50) &
-                              (data['PriceEuro'] <= selected_model_details['PriceEuro'].iloc[0] + 5000) &
-                              (data['PriceEuro'] >= selected_model_details['PriceEuro'].iloc[0] - 5000) &
-                              (data['Model'] != model_selection)]
+        # Die ähnlichsten Fahrzeuge aus dem vorberechneten Ähnlichkeitsindex, nach Abstand sortiert
+        position = data.index.get_loc(selected_model_details.index[0])
+        similar_models = load_similarity_index().recommend(position, k=empfehlung.DEFAULT_RECOMMENDATIONS)
         if not similar_models.empty:
-            for _, row in similar_models.iterrows():
-                st.text(f"{row['Brand']} {row['Model']} - Reichweite: {row['Range']}km, Preis: €{row['PriceEuro']}")
+            st.dataframe(similar_models[['Brand', 'Model', 'Range_km', 'PriceEuro', 'Efficiency_Wh_km', 'Accel_sec', 'Seats',
+                                         'BodyStyle', 'PowerTrain', 'Abstand']], hide_index=True)
         else:
             st.text("Nicht ähnliche Modelle zur Empfehlung vorhanden.")
 
+def app():
+    engine = load_filter_engine()
+    data = engine.data
+    st.title('Der Elektroauto-Browser')
+
+    # Hinzufügen von Filtern
+    min_price, max_price = (int(value) for value in engine.value_range('PriceEuro'))
+    max_range = int(engine.value_range('Range_km')[1])
+    min_seats, max_seats = (int(value) for value in engine.value_range('Seats'))
+    price_filter = st.sidebar.slider('Filtern nach Preis (Euro):', min_price, max_price, (min_price, max_price))
+    range_filter = st.sidebar.slider('Filtern nach Reichweite (km):', 0, max_range, (0, max_range))
+    seats_filter = st.sidebar.slider('Filtern nach Anzahl der Sitze:', min_seats, max_seats, (min_seats, max_seats))
+    body_style = st.sidebar.multiselect('Wählen Sie den Karosseriestil:', options=engine.category_values('BodyStyle'))
+    power_train = st.sidebar.multiselect('Wählen Sie den Antrieb:', options=engine.category_values('PowerTrain'))
+    rapid_charge = st.sidebar.checkbox('Schnellladung möglich?')
+
+    # Filtern der Daten
+    data_filtered = engine.filter(
+        ranges={'PriceEuro': price_filter, 'Range_km': range_filter, 'Seats': seats_filter},
+        categories={'BodyStyle': body_style, 'PowerTrain': power_train,
+                    'RapidCharge': ['Rapid charging possible'] if rapid_charge else []})
+
+    search_clicked = st.sidebar.button('Search')
+
+    if search_clicked:
+        # Anzeige der gefilterten Daten
+        st.write(f"Gefundene Fahrzeuge: {len(data_filtered)}")
+        st.dataframe(data_filtered)
+
+    # Interaktive Visualisierung der Daten mit Plotly
+    if not data_filtered.empty:
+        fig = px.scatter(data_filtered, x='PriceEuro', y='Range_km', color='Brand', hover_data=['Model'], title="Interaktiver Scatter Plot: Preis vs. Reichweite",
+                         render_mode=darstellung.render_mode(len(data_filtered)))
+        st.plotly_chart(fig)
+
+    # Auswahl von Marke und Modell als Fragment: nur dieser Teil wird bei einer Auswahl neu ausgeführt
+    show_model_details(data, data_filtered)
+
 if __name__ == "__main__":
     app()
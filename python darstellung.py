@@ -0,0 +1,86 @@
+import numpy as np
+import plotly.graph_objects as go
+
+# Ab dieser Punktzahl wird WebGL (Scattergl) statt SVG verwendet
+WEBGL_THRESHOLD = 1000
+
+# Höchstzahl an Punkten je Zeitreihe, die an den Browser geschickt wird
+MAX_POINTS_PER_TRACE = 500
+
+# Ab dieser Anzahl an Reihen werden sie zu einem Trace zusammengefasst
+PACK_THRESHOLD = 50
+
+
+# Render-Modus für plotly.express ('webgl' bei vielen Punkten, sonst 'svg')
+def render_mode(n_points, threshold=WEBGL_THRESHOLD):
+    return 'webgl' if n_points > threshold else 'svg'
+
+
+# Trace-Klasse für eine Punktzahl (go.Scattergl bei vielen Punkten, sonst go.Scatter)
+def scatter_class(n_points, threshold=WEBGL_THRESHOLD):
+    return go.Scattergl if n_points > threshold else go.Scatter
+
+
+# Largest-Triangle-Three-Buckets: reduziert eine nach x sortierte Reihe auf n_out Punkte
+# und erhält dabei die optisch markanten Punkte (Spitzen, Knicke)
+def lttb(x, y, n_out):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    every = (n - 2) / (n_out - 2)
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        # Mittelwert des nächsten Buckets als dritter Dreieckspunkt
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+# Ausschnitt [von, bis] einer Reihe auf der x-Achse und Downsampling auf max_points.
+# Wird der sichtbare Bereich kleiner, bleiben entsprechend mehr Details erhalten.
+def downsample(x, y, max_points=MAX_POINTS_PER_TRACE, visible_range=None):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    order = np.argsort(x, kind='stable')
+    x, y = x[order], y[order]
+    if visible_range is not None:
+        start = np.searchsorted(x, visible_range[0], side='left')
+        stop = np.searchsorted(x, visible_range[1], side='right')
+        x, y = x[start:stop], y[start:stop]
+    valid = np.isfinite(y)
+    return lttb(x[valid], y[valid], max_points)
+
+
+# Linien-Trace für eine Zeitreihe mit Downsampling und automatischem WebGL
+def line_trace(x, y, max_points=MAX_POINTS_PER_TRACE, visible_range=None, **kwargs):
+    x, y = downsample(x, y, max_points, visible_range)
+    return scatter_class(len(x))(x=x, y=y, **kwargs)
+
+
+# Viele Reihen in einem einzigen Trace: die Reihen werden durch NaN getrennt,
+# der Reihenname steht im Hover-Text
+def packed_line_trace(series, max_points=MAX_POINTS_PER_TRACE, visible_range=None, **kwargs):
+    xs, ys, names = [], [], []
+    for name, (x, y) in series.items():
+        x, y = downsample(x, y, max_points, visible_range)
+        xs.extend([x, [np.nan]])
+        ys.extend([y, [np.nan]])
+        names.extend([np.full(len(x), name, dtype=object), [None]])
+    if not xs:
+        return go.Scatter(x=[], y=[], **kwargs)
+    x = np.concatenate(xs)
+    return scatter_class(len(x))(x=x, y=np.concatenate(ys), text=np.concatenate(names), connectgaps=False,
+                                 hovertemplate='%{text}: %{y}<extra></extra>', **kwargs)
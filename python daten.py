@@ -0,0 +1,541 @@
+import glob
+import hashlib
+import json
+import os
+import importlib.util
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import messung
+
+try:
+    import pyarrow
+    import pyarrow.feather as feather
+except ImportError:
+    pyarrow = None
+
+# Verzeichnis für den spaltenorientierten Zwischenspeicher der Quelldateien
+CACHE_DIR = '.daten_cache'
+
+# Dateiendung des Zwischenspeichers (unkomprimiertes Arrow-IPC/Feather, per mmap lesbar)
+CACHE_SUFFIX = '.arrow'
+
+# Logische Namen der IEA-Datensätze und die zugehörigen Quelldateien
+IEA_DATEIEN = {
+    'ev_history': 'EV data history.csv',
+    'global_ev_data': 'IEA Global EV Data 2023.csv',
+    'electricity_demand_historical': 'IEA-EV-dataElectricity demandHistoricalCars (1).csv',
+    'electricity_demand_steps': 'IEA-EV-dataElectricity demandProjection-STEPSCars.csv',
+    'ev_sales_steps': 'IEA-EV-dataEV salesProjection-STEPSCars.csv',
+    'ev_sales_aps': 'IEA-EV-dataEV salesProjection-APSCars.csv',
+    'charging_points_historical': 'IEA-EV-dataEV charging pointsHistoricalEV (1).csv',
+    'charging_points_steps': 'IEA-EV-dataEV charging pointsProjection-STEPSEV.csv',
+}
+
+# Einheitliches Schema aller IEA-Tabellen im Langformat (keine Typerkennung durch pandas)
+IEA_DTYPES = {
+    'region': str,
+    'category': str,
+    'parameter': str,
+    'mode': str,
+    'powertrain': str,
+    'year': 'int64',
+    'unit': str,
+    'value': 'float64',
+}
+
+# Kompaktes Schema im Speicher: Textspalten als Kategorien mit einem gemeinsamen Wörterbuch
+# für alle IEA-Datensätze, Jahre als int16 und Werte als float32, soweit die Genauigkeit reicht
+LABEL_COLUMNS = ['region', 'category', 'parameter', 'mode', 'powertrain', 'unit']
+COMPACT_YEAR_DTYPE = 'int16'
+COMPACT_VALUE_DTYPE = 'float32'
+
+# Höchste relative Abweichung, bis zu der nicht ganzzahlige Werte als float32 gehalten werden;
+# ganzzahlige Werte (z. B. Fahrzeugzahlen) müssen in float32 exakt darstellbar sein
+VALUE_RTOL = 1e-6
+
+# Bezeichnung von Summenzeilen (z. B. im Aggregatwürfel); Teil des gemeinsamen Wörterbuchs
+TOTAL = 'Total'
+
+# Zeilen je Block beim Streaming-Lesen (scan_iea); bestimmt den Spitzenspeicher des Lesens
+SCAN_CHUNK_ROWS = 200_000
+
+# Verzeichnis der vorberechneten Artefakte (python vorberechnung.py). Die Datei 'aktuell'
+# nennt die gültige Version; leer oder ohne Bündel rechnet die App wie bisher selbst.
+BUNDLE_DIR = os.environ.get('EV_BUNDLE', 'artefakte')
+
+# Datei im Zwischenspeicher mit den Inhalts-Hashes der Datenbestände je logischem Namen
+# (aktueller und vorheriger Stand)
+PAYLOAD_MANIFEST = 'datenbestaende.json'
+
+# Sortierschlüssel der IEA-Tabellen; die Zwischenspeicher liegen bereits in dieser Reihenfolge
+# vor, damit Abfrageobjekte (abfrage.IEAQuery) die Daten nicht umsortieren und kopieren müssen
+KEY_COLUMNS = ['parameter', 'region', 'powertrain', 'category', 'year']
+
+
+# Schneller Fingerabdruck einer Datei über Änderungszeit und Größe
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+# Inhalts-Hash einer Datei (SHA-256)
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_content_hashes = {}
+
+
+# Inhalts-Hash einer Datei, im Prozess gemerkt, solange sich der Fingerabdruck nicht ändert
+def content_hash(path):
+    fingerprint = file_fingerprint(path)
+    cached = _content_hashes.get(path)
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, file_hash(path))
+        _content_hashes[path] = cached
+    return cached[1]
+
+
+# Version eines Datenstands aus den Inhalts-Hashes der beteiligten IEA-Dateien
+def dataset_version(names):
+    digest = hashlib.sha256()
+    for name in sorted(names):
+        digest.update(name.encode())
+        digest.update(content_hash(IEA_DATEIEN[name]).encode())
+    return digest.hexdigest()[:16]
+
+
+def _cache_paths(name):
+    base = os.path.join(CACHE_DIR, name)
+    return base + CACHE_SUFFIX, base + '.json'
+
+
+# Schreibt eine Tabelle als unkomprimierte Feather-Datei. Erst in eine temporäre Datei
+# schreiben, damit parallele Prozesse nie eine halbe Datei lesen.
+def write_frame(data, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    feather.write_feather(data.reset_index(drop=True), tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+# Liest eine Feather-Datei speicherabgebildet (mmap). Zahlenspalten und (mit pyarrow-
+# Strings) auch Textspalten verweisen direkt auf die Seiten der Datei, so dass alle
+# Sitzungen und alle Worker-Prozesse eines Hosts dieselben Bytes nutzen.
+def read_frame(path):
+    return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+# Liefert den Zwischenspeicher einer Quelldatei oder baut ihn neu auf.
+# Ungültig wird der Speicher erst, wenn sich der Inhalt (Hash) der Quelle ändert;
+# eine reine Änderung der Änderungszeit aktualisiert nur die Metadaten.
+def load_snapshot(name, source_path, read_source):
+    if pyarrow is None:
+        return read_source(source_path)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    data_path, meta_path = _cache_paths(name)
+    mtime_ns, size = file_fingerprint(source_path)
+    meta = _read_meta(meta_path)
+
+    if meta is not None and os.path.exists(data_path):
+        if meta['mtime_ns'] == mtime_ns and meta['size'] == size:
+            messung.cache_event('daten.snapshot', True)
+            return read_frame(data_path)
+        source_hash = file_hash(source_path)
+        if meta['sha256'] == source_hash:
+            meta.update(mtime_ns=mtime_ns, size=size)
+            _write_meta(meta_path, meta)
+            messung.cache_event('daten.snapshot', True)
+            return read_frame(data_path)
+    else:
+        source_hash = file_hash(source_path)
+
+    messung.cache_event('daten.snapshot', False)
+    with messung.span('daten.read_source', source=source_path):
+        data = read_source(source_path)
+    write_frame(data, data_path)
+    _write_meta(meta_path, {'source': source_path, 'mtime_ns': mtime_ns, 'size': size, 'sha256': source_hash})
+    return data
+
+
+@messung.traced()
+def read_iea_csv(path):
+    return pd.read_csv(path, dtype=IEA_DTYPES)
+
+
+# Typisierter Datenbestand je Dateiinhalt. Dateien mit identischem Inhalt (z. B.
+# 'EV data history.csv' und die historische Stromnachfrage) werden nur einmal geparst
+# und nur einmal im Speicher gehalten; st.cache_resource teilt ihn über alle Sitzungen.
+@messung.traced_cache(st.cache_resource)
+def _load_payload(source_hash, _source_path):
+    if pyarrow is None:
+        return read_iea_csv(_source_path)
+
+    data_path = _payload_path(source_hash)
+    messung.cache_event('daten.payload', os.path.exists(data_path))
+    if not os.path.exists(data_path):
+        data = read_iea_csv(_source_path).sort_values(KEY_COLUMNS, kind='stable')
+        write_frame(data, data_path)
+        _prune_payloads()
+    return read_frame(data_path)
+
+
+def _payload_path(source_hash):
+    return os.path.join(CACHE_DIR, source_hash + CACHE_SUFFIX)
+
+
+# Entfernt überholte Datenbestände. Erhalten bleiben je logischem Namen der aktuelle und der
+# unmittelbar vorherige Stand, weil Würfel und Prognosen bei einem neuen Stand aus den alten
+# Zeilen der geänderten Partitionen fortgeschrieben werden.
+def _prune_payloads():
+    manifest_path = os.path.join(CACHE_DIR, PAYLOAD_MANIFEST)
+    manifest = _read_meta(manifest_path) or {}
+    stored, previous = manifest.get('current', {}), manifest.get('previous', {})
+    current = iea_registry()
+    previous = {name: stored[name] if stored.get(name, source_hash) != source_hash else previous.get(name)
+                for name, source_hash in current.items()}
+    previous = {name: source_hash for name, source_hash in previous.items() if source_hash}
+    _write_meta(manifest_path, {'current': current, 'previous': previous})
+
+    keep = set(current.values()) | set(previous.values())
+    for path in glob.glob(_payload_path('[0-9a-f]' * 64)):
+        if os.path.basename(path)[:-len(CACHE_SUFFIX)] not in keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# Gespeicherter Datenbestand zu einem Inhalts-Hash (auch der vorherige Stand, solange die
+# Datei im Zwischenspeicher liegt); None, wenn er nicht vorhanden ist
+def read_payload(source_hash):
+    data_path = _payload_path(source_hash)
+    if pyarrow is None or not os.path.exists(data_path):
+        return None
+    return read_frame(data_path)
+
+
+# Streaming-Leser für (beliebig große) IEA-Exporte: die Datei wird blockweise mit festen
+# Datentypen gelesen, Textspalten als Kategorien. Bedingungen auf parameter, mode, category
+# und region (Wert oder Liste) sowie ein Jahresbereich year=(von, bis) werden schon beim
+# Lesen jedes Blocks angewendet, so dass nur die passenden Zeilen im Speicher bleiben.
+@messung.traced()
+def scan_iea(name, parameter=None, mode=None, category=None, region=None, year=None, chunksize=SCAN_CHUNK_ROWS):
+    path = IEA_DATEIEN.get(name, name)
+    predicates = {column: [values] if isinstance(values, str) else list(values)
+                  for column, values in (('parameter', parameter), ('mode', mode), ('category', category), ('region', region))
+                  if values is not None}
+    dtypes = {column: 'category' if dtype is str else dtype for column, dtype in IEA_DTYPES.items()}
+
+    pieces = []
+    with pd.read_csv(path, dtype=dtypes, chunksize=chunksize) as reader:
+        for chunk in reader:
+            keep = np.ones(len(chunk), dtype=bool)
+            for column, values in predicates.items():
+                keep &= chunk[column].isin(values).to_numpy()
+            if year is not None:
+                low, high = year
+                years = chunk['year'].to_numpy()
+                if low is not None:
+                    keep &= years >= low
+                if high is not None:
+                    keep &= years <= high
+            pieces.append(chunk[keep])
+
+    if not pieces:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+    # Die Kategorien der einzelnen Blöcke zu einem gemeinsamen, sortierten Wörterbuch vereinen
+    data = pd.DataFrame({
+        column: pd.api.types.union_categoricals([piece[column] for piece in pieces], sort_categories=True)
+        if dtype == 'category' else np.concatenate([piece[column].to_numpy() for piece in pieces])
+        for column, dtype in dtypes.items()
+    })
+    return data.sort_values(KEY_COLUMNS, kind='stable').reset_index(drop=True)
+
+
+# Bezeichnungen der Textspalten einer Quelldatei; gelesen werden blockweise nur diese Spalten
+def scan_labels(path, chunksize=SCAN_CHUNK_ROWS):
+    labels = {column: set() for column in LABEL_COLUMNS}
+    with pd.read_csv(path, usecols=LABEL_COLUMNS, dtype='category', chunksize=chunksize) as reader:
+        for chunk in reader:
+            for column in LABEL_COLUMNS:
+                labels[column].update(chunk[column].cat.categories)
+    return labels
+
+
+def _dictionary_path(version):
+    return os.path.join(CACHE_DIR, f'woerterbuch-{version}.json')
+
+
+# Gemeinsames Wörterbuch {Spalte: CategoricalDtype} über alle IEA-Datensätze, lexikalisch
+# sortiert. Alle kompakten Tabellen nutzen dieselben Kategorien, so dass concat und merge
+# zwischen ihnen Kategorien bleiben und nicht zu Text werden. Die Bezeichnungen werden je
+# Datenstand einmal aus den Textspalten der Quelldateien gestreamt und gespeichert; die
+# vollständigen Datenbestände werden dafür nicht geladen.
+@st.cache_resource
+def _label_dictionary(version):
+    path = _dictionary_path(version)
+    stored = _read_meta(path)
+    messung.cache_event('daten.woerterbuch', stored is not None)
+    if stored is None:
+        labels = {column: {TOTAL} if column in ('region', 'powertrain') else set() for column in LABEL_COLUMNS}
+        # Dateien mit identischem Inhalt nur einmal lesen
+        for source_path in {content_hash(source_path): source_path for source_path in IEA_DATEIEN.values()}.values():
+            for column, values in scan_labels(source_path).items():
+                labels[column].update(values)
+        stored = {column: sorted(values) for column, values in labels.items()}
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        _write_meta(tmp_path, stored)
+        os.replace(tmp_path, path)
+        # Wörterbücher älterer Datenstände entfernen
+        for old_path in glob.glob(_dictionary_path('*')):
+            if old_path != path:
+                os.remove(old_path)
+    return {column: pd.CategoricalDtype(values) for column, values in stored.items()}
+
+
+def label_dictionary():
+    return _label_dictionary(dataset_version(IEA_DATEIEN))
+
+
+# float32 genügt, wenn ganzzahlige Werte exakt bleiben und alle übrigen höchstens um VALUE_RTOL abweichen
+def float32_allowed(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    narrowed = values.astype(np.float32).astype(np.float64)
+    integral = values == np.round(values)
+    if not np.array_equal(narrowed[integral], values[integral]):
+        return False
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error = np.abs(narrowed[~integral] - values[~integral]) / np.abs(values[~integral])
+    return not np.any(error > VALUE_RTOL)
+
+
+# Wandelt eine IEA-Tabelle in das kompakte Schema um. Die Sortierung bleibt erhalten, denn
+# die Kategorien sind lexikalisch geordnet.
+def compact(data, dictionary=None):
+    dictionary = dictionary or label_dictionary()
+    columns = {}
+    for column in data.columns:
+        if column in dictionary:
+            dtype = dictionary[column]
+            present = data[column].cat.categories if isinstance(data[column].dtype, pd.CategoricalDtype) else data[column].dropna().unique()
+            unknown = set(present) - set(dtype.categories)
+            if unknown:
+                # Bezeichnungen außerhalb des Wörterbuchs (z. B. aus einem fremden Export) nicht verlieren
+                dtype = pd.CategoricalDtype(sorted(set(dtype.categories) | unknown))
+            columns[column] = data[column].astype(dtype)
+        elif column == 'year':
+            years = data[column].to_numpy()
+            if len(years) and (years.min() < np.iinfo(COMPACT_YEAR_DTYPE).min or years.max() > np.iinfo(COMPACT_YEAR_DTYPE).max):
+                raise ValueError(f'Jahr außerhalb des Bereichs von {COMPACT_YEAR_DTYPE}')
+            columns[column] = years.astype(COMPACT_YEAR_DTYPE)
+        elif column == 'value' and float32_allowed(data[column]):
+            columns[column] = data[column].to_numpy(dtype=COMPACT_VALUE_DTYPE)
+        else:
+            columns[column] = data[column]
+    return pd.DataFrame(columns, index=data.index)
+
+
+@messung.traced_cache(st.cache_resource)
+def _load_compact(source_hash, _name):
+    return compact(load_iea(_name))
+
+
+# Laden eines IEA-Datensatzes im kompakten Schema (einmal pro Dateiinhalt)
+def load_compact(name):
+    return _load_compact(content_hash(IEA_DATEIEN[name]), name).copy(deep=False)
+
+
+# Speicherbedarf je Datensatz: ursprüngliches Schema (Text, int64, float64) gegenüber dem
+# kompakten Schema, in Bytes einschließlich der Zeichenketten
+def memory_report(names=None):
+    rows = []
+    for name in names or IEA_DATEIEN:
+        original = read_iea_csv(IEA_DATEIEN[name])
+        compacted = compact(original)
+        original_bytes = int(original.memory_usage(deep=True).sum())
+        compact_bytes = int(compacted.memory_usage(deep=True).sum())
+        rows.append({
+            'dataset': name,
+            'rows': len(original),
+            'original_bytes': original_bytes,
+            'compact_bytes': compact_bytes,
+            'ratio': round(original_bytes / compact_bytes, 1) if compact_bytes else None,
+            'value_dtype': str(compacted['value'].dtype),
+        })
+    return pd.DataFrame(rows)
+
+
+# Zuordnung logischer Name -> Inhalts-Hash der Quelldatei
+def iea_registry():
+    return {name: content_hash(path) for name, path in IEA_DATEIEN.items()}
+
+
+# Laden eines IEA-Datensatzes über seinen logischen Namen.
+# Geliefert wird eine flache Sicht auf den gemeinsamen Datenbestand; sie darf nicht
+# verändert werden (für Änderungen vorher .copy() aufrufen).
+@messung.traced()
+def load_iea(name):
+    path = IEA_DATEIEN[name]
+    return _load_payload(content_hash(path), path).copy(deep=False)
+
+
+# Fahrzeugdaten (Excel) mit logischem Namen; gelesen werden binäre Schnappschüsse
+SPEC_DATEIEN = {
+    'specs': 'ElectricCarData_Norm_Sorted.xlsx',
+    'specs_ii': 'ElectricCarData_Norm_SortedII.xlsx',
+}
+
+
+_background_thread = None
+
+
+@messung.traced_cache(st.cache_resource)
+def _load_specs(name, fingerprint):
+    # Läuft gerade der Hintergrund-Thread, auf ihn warten statt die Datei doppelt zu lesen
+    if _background_thread is not None:
+        _background_thread.join()
+    return load_snapshot(name, SPEC_DATEIEN[name], pd.read_excel)
+
+
+# Laden einer Fahrzeugtabelle; die Excel-Datei wird nur beim ersten Mal mit openpyxl gelesen.
+# Wie bei load_iea ist das Ergebnis eine flache Sicht auf den gemeinsamen Bestand.
+@messung.traced()
+def load_specs(name):
+    return _load_specs(name, file_fingerprint(SPEC_DATEIEN[name])).copy(deep=False)
+
+
+def _build_spec_snapshots():
+    for name, path in SPEC_DATEIEN.items():
+        load_snapshot(name, path, pd.read_excel)
+
+
+# Erzeugt die Schnappschüsse der Excel-Dateien in einem Hintergrund-Thread,
+# damit die erste Seite gezeichnet werden kann, bevor openpyxl fertig ist.
+def start_background_load():
+    global _background_thread
+    if _background_thread is None:
+        _background_thread = threading.Thread(target=_build_spec_snapshots, name='spec-snapshots', daemon=True)
+        _background_thread.start()
+    return _background_thread
+
+
+# Inhalts-Hashes aller Quelldateien, aus denen die Artefakte berechnet werden
+def bundle_sources():
+    return {path: content_hash(path) for path in list(IEA_DATEIEN.values()) + list(SPEC_DATEIEN.values())}
+
+
+# Inhalts-Hashes der Module, deren Code die Artefakte bestimmt (ohne sie zu importieren)
+def code_hashes(module_names):
+    return {name: file_hash(importlib.util.find_spec(name).origin) for name in module_names}
+
+
+_bundle_checks = {}
+_bundle_lock = threading.Lock()
+
+
+# Übernimmt den Zwischenspeicher des Bündels (Schnappschüsse, Würfel, Prognosen, Modelle)
+# in CACHE_DIR; vorhandene Dateien bleiben unverändert
+def _install_bundle_cache(directory):
+    source = os.path.join(directory, 'cache')
+    for root, _, files in os.walk(source):
+        target = os.path.join(CACHE_DIR, os.path.relpath(root, source))
+        os.makedirs(target, exist_ok=True)
+        for file in files:
+            if not os.path.exists(os.path.join(target, file)):
+                tmp_path = os.path.join(target, f'{file}.{os.getpid()}.tmp')
+                shutil.copy2(os.path.join(root, file), tmp_path)
+                os.replace(tmp_path, os.path.join(target, file))
+
+
+# Aktuelles Bündel als (Verzeichnis, Manifest), wenn es zu den Quelldateien und zum Code passt,
+# sonst None. Geprüft wird einmal je Fingerabdruck der Quellen; beim ersten Treffer wird der
+# Zwischenspeicher des Bündels übernommen.
+def active_bundle():
+    if not BUNDLE_DIR or pyarrow is None:
+        return None
+    try:
+        with open(os.path.join(BUNDLE_DIR, 'aktuell'), encoding='utf-8') as f:
+            directory = os.path.join(BUNDLE_DIR, f.read().strip())
+    except OSError:
+        return None
+    manifest = _read_meta(os.path.join(directory, 'manifest.json'))
+    if manifest is None:
+        return None
+    try:
+        key = (directory, tuple(file_fingerprint(path) for path in bundle_sources()))
+    except OSError:
+        return None
+    with _bundle_lock:
+        if key not in _bundle_checks:
+            valid = manifest.get('sources') == bundle_sources()
+            try:
+                valid = valid and code_hashes(manifest.get('code', {})) == manifest.get('code')
+            except (ImportError, AttributeError, TypeError, OSError):
+                valid = False
+            if valid:
+                _install_bundle_cache(directory)
+            _bundle_checks[key] = valid
+        valid = _bundle_checks[key]
+    return (directory, manifest) if valid else None
+
+
+# Vorberechnetes Artefakt aus dem aktuellen Bündel (Tabelle oder Tupel von Tabellen);
+# ohne gültiges Bündel wird es mit build() berechnet
+def artifact(name, build):
+    bundle = active_bundle()
+    entry = bundle[1].get('artifacts', {}).get(name) if bundle is not None else None
+    messung.cache_event('daten.artifact', entry is not None)
+    if entry is None:
+        return build()
+    frames = [read_frame(os.path.join(bundle[0], file)) for file in entry['files']]
+    return frames[0] if entry['single'] else tuple(frames)
+
+
+# Schreibt ein Artefakt (Tabelle oder Tupel von Tabellen) in ein Bündelverzeichnis und
+# liefert seinen Eintrag für das Manifest
+def write_artifact(directory, name, result):
+    single = isinstance(result, pd.DataFrame)
+    frames = [result] if single else list(result)
+    files = [os.path.join('tabellen', f'{name}-{i}{CACHE_SUFFIX}') for i in range(len(frames))]
+    for frame, file in zip(frames, files):
+        write_frame(frame, os.path.join(directory, file))
+    return {'files': files, 'single': single, 'rows': [len(frame) for frame in frames]}
+
+
+# Pfad einer Datei im aktuellen Bündel oder None
+def bundle_file(*parts):
+    bundle = active_bundle()
+    if bundle is None:
+        return None
+    path = os.path.join(bundle[0], *parts)
+    return path if os.path.exists(path) else None
+
+
+if __name__ == '__main__':
+    print(memory_report().to_string(index=False))
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+# Merkmale für die Ähnlichkeit von Fahrzeugen
+NUMERIC_FEATURES = ['Range_km', 'PriceEuro', 'Efficiency_Wh_km', 'Accel_sec', 'Seats']
+CATEGORICAL_FEATURES = ['BodyStyle', 'PowerTrain', 'Segment']
+
+# Gewicht einer abweichenden Kategorie im Verhältnis zu einer Standardabweichung
+CATEGORICAL_WEIGHT = 0.5
+
+# Anzahl der standardmäßig empfohlenen Modelle
+DEFAULT_RECOMMENDATIONS = 10
+
+
+# Ähnlichkeitsindex über einer float32-Merkmalsmatrix: Zahlenmerkmale werden
+# standardisiert, Kategorien als gewichtete 0/1-Spalten angehängt. Die k ähnlichsten
+# Fahrzeuge ergeben sich aus einem Matrix-Vektor-Produkt und argpartition.
+class SimilarityIndex:
+    def __init__(self, data, numeric=NUMERIC_FEATURES, categorical=CATEGORICAL_FEATURES, categorical_weight=CATEGORICAL_WEIGHT,
+                 group_column='Model'):
+        self.data = data
+        # Zeilen derselben Gruppe (gleicher Modellname) werden nicht gegenseitig empfohlen
+        self._groups = pd.factorize(data[group_column])[0] if group_column else None
+        numbers = data[numeric].to_numpy(dtype=np.float64)
+        # Mittelwert und Streuung nur über vorhandene Werte (wie np.nanmean/np.nanstd, ohne
+        # Warnung bei ganz leeren Spalten); fehlende Werte erhalten den Spaltenmittelwert,
+        # standardisiert also 0, damit ein einzelnes NaN nicht alle Abstände ungültig macht
+        missing = np.isnan(numbers)
+        counts = np.maximum((~missing).sum(axis=0), 1)
+        mean = np.where(missing, 0.0, numbers).sum(axis=0) / counts
+        numbers = np.where(missing, mean, numbers)
+        std = np.sqrt(((numbers - mean) ** 2).sum(axis=0) / counts)
+        std[std == 0] = 1.0
+        scaled = (numbers - mean) / std
+        # Die halbe Gewichtung je Spalte ergibt beim Abstand zweier verschiedener Kategorien
+        # genau categorical_weight (zwei Spalten unterscheiden sich)
+        dummies = pd.get_dummies(data[categorical].astype(str)).to_numpy(dtype=np.float64) * np.sqrt(categorical_weight / 2)
+        self.features = np.ascontiguousarray(np.hstack([scaled, dummies]), dtype=np.float32)
+        self._squared_norms = np.einsum('ij,ij->i', self.features, self.features)
+
+    # Positionen und Abstände der k nächsten Nachbarn der Zeile an Position 'position'.
+    # 'exclude' ist eine optionale boolesche Maske von Zeilen, die nicht empfohlen werden.
+    def nearest(self, position, k=DEFAULT_RECOMMENDATIONS, exclude=None):
+        query = self.features[position]
+        distances = self._squared_norms + self._squared_norms[position] - 2.0 * (self.features @ query)
+        distances[position] = np.inf
+        if self._groups is not None:
+            distances[self._groups == self._groups[position]] = np.inf
+        if exclude is not None:
+            distances[exclude] = np.inf
+        candidates = int(np.isfinite(distances).sum())
+        k = min(k, candidates)
+        if k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        return nearest, np.sqrt(np.maximum(distances[nearest], 0))
+
+    # Die k ähnlichsten Fahrzeuge als Tabelle, nach Abstand sortiert
+    def recommend(self, position, k=DEFAULT_RECOMMENDATIONS, exclude=None):
+        positions, distances = self.nearest(position, k, exclude)
+        recommendations = self.data.iloc[positions].copy()
+        recommendations['Abstand'] = distances
+        return recommendations
@@ -4,44 +4,60 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 
-@st.cache_data
-def app():
+import daten
+import messung
+import szenarien
+import trend
+import verknuepfung
+import wuerfel
+
+# Stromnachfrage (STEPS) je Region und Jahr und ihre Verknüpfung mit dem EV-Bestand
+def build_data():
+    # Laden der vorberechneten Summen und Mittelwerte (summiert über alle Antriebsarten)
+    cube = wuerfel.cube_query()
+    original_data = cube.select(dataset='electricity_demand_steps', parameter="Electricity demand", powertrain=wuerfel.TOTAL)
+    original_data = original_data[original_data['region'] != wuerfel.TOTAL]
+
+    # Mittlere Stromnachfrage und EV-Bestand je Region und Jahr aus dem gemeinsamen Verknüpfungsindex (ohne Merge)
+    merged_data_aggregated = verknuepfung.load_index().frame(['demand', 'stock'])
+    merged_data_aggregated = merged_data_aggregated.rename(columns={'demand': 'electricity_demand', 'stock': 'ev_stock'})
+    return original_data, merged_data_aggregated
+
+@messung.traced_cache(st.cache_resource)
+def load_data(version):
+    return daten.artifact('energie', build_data)
+
+# Kennzahlen für den Szenarienvergleich und ihre Achsenbeschriftung
+SCENARIO_PARAMETERS = {
+    'Electricity demand': 'Der Stromverbrauch (GWh)',
+    'EV stock': 'EV-Bestand',
+    'EV sales': 'Verkauf von EV',
+}
+
+@messung.traced_cache(st.cache_data)
+def show_analysis(version):
     st.title("Analyse der Auswirkungen von Elektrofahrzeugen auf den Stromverbrauch")
     
-    # Laden der Daten
-    original_data_path = 'IEA-EV-dataElectricity demandProjection-STEPSCars.csv'
-    new_data_path = 'IEA-EV-dataElectricity demandHistoricalCars (1).csv'
-    
-    original_data = pd.read_csv(original_data_path)
-    new_data = pd.read_csv(new_data_path)
+    # Stromnachfrage und zusammengeführte Tabelle, vorberechnet aus dem Artefaktbündel
+    original_data, merged_data_aggregated = load_data(version)
 
     # Einführungstext
     st.write("""
     Diese Analyse zeigt die Auswirkungen von Elektrofahrzeugen (EVs) auf den Stromverbrauch. Die Übersicht zeigt, wie das Wachstum der EV-Bestände den Energiesektor beeinflusst und wie verschiedene Regionen sich an die sich ändernden Energiebedürfnisse anpassen.
          """)
 
-    # Filtern und Vorbereiten der Daten
-    electricity_demand = original_data[original_data['parameter'] == "Electricity demand"].copy()
-    ev_stock = new_data[new_data['parameter'] == "EV stock"].copy()
-
-    electricity_demand_relevant = electricity_demand[['region', 'year', 'value']].rename(columns={'value': 'electricity_demand'})
-    ev_stock_relevant = ev_stock[['region', 'year', 'value']].rename(columns={'value': 'ev_stock'})
-
-    # Zusammenführen und Aggregieren der Daten
-    merged_data = pd.merge(electricity_demand_relevant, ev_stock_relevant, on=['region', 'year'], how='inner')
-    merged_data_aggregated = merged_data.groupby(['region', 'year']).agg({'electricity_demand': 'mean', 'ev_stock': 'sum'}).reset_index()
-
     # Visualisierung der Korrelation mit Plotly
     fig = px.scatter(merged_data_aggregated, x='ev_stock', y='electricity_demand',
-                     trendline="ols",
                      title="Die Korrelation zwischen dem Anstieg des EV-Verkaufs und dem Verbrauch von elektrischer Energie")
+    # Trendlinie in geschlossener Form statt trendline="ols" (kein statsmodels nötig)
+    ev_stock, electricity_demand = verknuepfung.load_index().values(['stock', 'demand'])
+    trend.add_trendline(fig, ev_stock, electricity_demand)
     fig.update_layout(xaxis_title="Verkauf von Elektrofahrzeugen", yaxis_title="Der Stromverbrauch (GWh)")
     st.plotly_chart(fig)
 
-    # Vorbereiten der Daten für weitere Visualisierungen
-    electricity_demand = original_data[original_data['parameter'] == "Electricity demand"].copy()
-    electricity_demand['value'] = pd.to_numeric(electricity_demand['value'], errors='coerce')
-    electricity_demand_trends = electricity_demand.pivot_table(index='year', columns='region', values='value', aggfunc='sum').reset_index()
+    # Vorbereiten der Daten für weitere Visualisierungen (Stromnachfrage im Szenario STEPS aus der Szenario-Engine)
+    steps_demand = szenarien.load_engine().series('Electricity demand', region=original_data['region'].unique(), scenario='Projection-STEPS')
+    electricity_demand_trends = steps_demand.pivot(index='year', columns='region', values='value').reset_index()
 
     # Visualisierung der Stromnachfrage-Trends mit Plotly
     st.write("## Jährliches Wachstum der Nachfrage nach elektrischer Energie nach Regionen.")
@@ -51,6 +67,47 @@ def app():
     fig.update_layout(xaxis_title="Jahr", yaxis_title="Der Stromverbrauch (GWh)", legend_title="Region")
     st.plotly_chart(fig)
 
+# Fragment für den Szenarienvergleich; nur dieser Teil wird bei einer neuen Auswahl neu gezeichnet
+@st.fragment
+def show_scenarios():
+    engine = szenarien.load_engine()
+    st.write("## Szenarienvergleich: historische Werte, STEPS und APS")
+    parameter = st.selectbox('Bitte wählen Sie eine Kennzahl aus:', list(SCENARIO_PARAMETERS))
+    regions = engine.projection_regions(parameter)
+    region = st.selectbox('Bitte wählen Sie eine Region aus:', regions, index=regions.index('World') if 'World' in regions else 0)
+
+    # Historische Reihe, fortgeschrieben mit den Projektionen der Szenarien
+    series = engine.series(parameter, region=region, kind='stitched')
+    fig = px.line(series, x='year', y='value', color='scenario', markers=True,
+                  title=f"{parameter} in {region}: historisch und je Szenario",
+                  labels={'value': SCENARIO_PARAMETERS[parameter], 'year': 'Jahr', 'scenario': 'Szenario'})
+    st.plotly_chart(fig)
+
+    # Abweichung vom Bezugsszenario im letzten Jahr und Übergang von den historischen Werten
+    delta = engine.series(parameter, region=region, kind='delta')
+    growth = engine.series(parameter, region=region, kind='growth')
+    columns = st.columns(len(engine.scenarios))
+    for column, scenario in zip(columns, engine.scenarios):
+        values = engine.series(parameter, region=region, scenario=scenario)
+        if values.empty:
+            continue
+        last = values.iloc[-1]
+        scenario_delta = delta[(delta['scenario'] == scenario) & (delta['year'] == last['year'])]['value']
+        scenario_growth = growth[(growth['scenario'] == scenario) & (growth['year'] == last['year'])]['value']
+        column.metric(f"{scenario} {int(last['year'])}", f"{last['value']:,.0f}",
+                      f"{scenario_delta.iloc[0]:+,.0f} ggü. {szenarien.REFERENCE}" if len(scenario_delta) and scenario not in (szenarien.HISTORICAL, szenarien.REFERENCE) else None)
+        if len(scenario_growth):
+            column.caption(f"Wachstum p. a. zuletzt: {scenario_growth.iloc[0]:.1%}")
+    continuity = engine.continuity_table(parameter, region=region)
+    if not continuity.empty:
+        st.caption('Übergang von den historischen Werten in die Projektionen (Abweichung im letzten historischen Jahr): '
+                   + ', '.join(f"{row.scenario} {int(row.anchor_year)}: {row.gap:+.1%}" for row in continuity.itertuples()))
+
+def app():
+    # Datenstand der IEA-Dateien als Schlüssel der Zwischenspeicher, damit neue Dateien nicht die alten Diagramme liefern
+    show_analysis(daten.dataset_version(daten.IEA_DATEIEN))
+    show_scenarios()
+
     # Fazit und Implikationen
     st.write("""
     Abschließend hat das Wachstum des EV-Verkaufs einen signifikanten Einfluss auf den Stromverbrauch. Energienetze müssen sich weiterentwickeln, um diesen Trend zu unterstützen. 
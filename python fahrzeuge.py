@@ -0,0 +1,80 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+import daten
+import messung
+
+# Deklaratives Schema der Einheitenspalten:
+# Zielspalte -> (Quellspalte, regulärer Ausdruck mit einer Gruppe für die Zahl, Datentyp, Ersatzwert)
+# Dezimalkommas werden vor der Umwandlung durch Punkte ersetzt.
+FAHRZEUG_SCHEMA = {
+    'Range_km': ('Range', r'(\d+)\s*km', 'int64', None),
+    'TopSpeed_kmh': ('TopSpeed', r'(\d+)\s*km/h', 'int64', None),
+    'Accel_sec': ('Accel', r'(\d+(?:\.\d+)?)\s*sec', 'float64', None),
+    'Efficiency_Wh_km': ('Efficiency', r'(\d+(?:\.\d+)?)\s*Wh/km', 'float64', None),
+    'FastCharge_km/h': ('FastCharge', r'(\d+)', 'float32', 0),
+}
+
+BATTERIE_SCHEMA = {
+    'Max_DC_Ladeleist': ('Ladeleist', r'DC:(\d+,\d+|\d+)', 'float64', None),
+    'WLTP_komb_kWh100km': ('WLTP_komb', r'(\d+(?:[.,]\d+)?)\s*kWh/100 km', 'float64', None),
+}
+
+SCHEMAS = {
+    'fahrzeuge': FAHRZEUG_SCHEMA,
+    'batterie': BATTERIE_SCHEMA,
+}
+
+
+# Wandelt alle Einheitenspalten eines Schemas mit vektorisierten String-Operationen um
+def normalize(data, schema):
+    data = data.copy()
+    for target, (source, pattern, dtype, fill_value) in schema.items():
+        numbers = data[source].astype('string').str.extract(pattern, expand=False).str.replace(',', '.', regex=False)
+        values = pd.to_numeric(numbers, errors='coerce')
+        if fill_value is not None:
+            values = values.fillna(fill_value)
+        data[target] = values.astype(dtype)
+    return data
+
+
+# Zusätzliche Aufbereitung der Batteriedaten: Marke/Modell aus 'Fahrzeug' und Effizienz
+def prepare_battery_data(data):
+    data = normalize(data, BATTERIE_SCHEMA)
+    data['Efficiency_km_per_kWh'] = data['Reichw_E_wert'] / data['AntriebsbatterieKapazitaetNettoKwh']
+    names = data['Fahrzeug'].astype('string').str.strip().str.extract(r'^(\S+)\s*(.*)$')
+    data['Brand'] = names[0]
+    data['Model'] = names[1].str.replace(r'\s+', ' ', regex=True)
+    return data
+
+
+def _read_source(path, schema_name):
+    # Registrierte Fahrzeugtabellen werden aus ihrem binären Schnappschuss gelesen
+    for name, spec_path in daten.SPEC_DATEIEN.items():
+        if spec_path == path:
+            raw = daten.load_specs(name)
+            break
+    else:
+        raw = pd.read_excel(path)
+    if schema_name == 'batterie':
+        return prepare_battery_data(raw)
+    return normalize(raw, SCHEMAS[schema_name])
+
+
+@messung.traced_cache(st.cache_resource)
+def _load_normalized(path, fingerprint, schema_name):
+    name = f'{os.path.splitext(os.path.basename(path))[0]}-{schema_name}'
+    return daten.load_snapshot(name, path, lambda source: _read_source(source, schema_name))
+
+
+# Normalisierte Tabelle einer Excel-Datei; sie wird einmal pro Dateiversion berechnet,
+# auf der Festplatte gespeichert und von allen Seiten gemeinsam genutzt
+def load_normalized(path, schema_name='fahrzeuge'):
+    return _load_normalized(path, daten.file_fingerprint(path), schema_name).copy(deep=False)
+
+
+# Normalisierte Fahrzeugtabelle über den logischen Namen aus daten.SPEC_DATEIEN
+def load_vehicles(name='specs'):
+    return load_normalized(daten.SPEC_DATEIEN[name], 'fahrzeuge')
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import messung
+
+# Maximale Anzahl gemerkter Filterergebnisse (LRU)
+MAX_CACHED_FILTERS = 256
+
+
+# Filter über einer festen Tabelle mit vorberechneten Indizes:
+# - Zahlenspalten: sortierte Werte und Zeilenpositionen, Bereiche per Binärsuche
+# - Kategoriespalten: Codes je Zeile und die Zeilenpositionen je Wert
+# Eine Abfrage beginnt mit der kleinsten Kandidatenmenge und prüft die übrigen
+# Bedingungen nur noch auf diesen Zeilen.
+class FilterEngine:
+    def __init__(self, data, range_columns, category_columns, cache_size=MAX_CACHED_FILTERS):
+        self.data = data
+        self._sorted = {}
+        for column in range_columns:
+            values = data[column].to_numpy()
+            order = np.argsort(values, kind='stable')
+            self._sorted[column] = (values, values[order], order)
+
+        self._codes = {}
+        self._positions = {}
+        for column in category_columns:
+            codes, uniques = pd.factorize(data[column])
+            self._codes[column] = (codes, {value: code for code, value in enumerate(uniques)})
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self._positions[column] = {value: order[bounds[code]:bounds[code + 1]] for code, value in enumerate(uniques)}
+
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    # Kleinster und größter Wert einer Zahlenspalte (aus dem sortierten Index)
+    def value_range(self, column):
+        sorted_values = self._sorted[column][1]
+        return sorted_values[0], sorted_values[-1]
+
+    # Vorkommende Werte einer Kategoriespalte in der Reihenfolge ihres ersten Auftretens
+    def category_values(self, column):
+        return list(self._codes[column][1])
+
+    def _range_candidates(self, column, low, high):
+        _, sorted_values, order = self._sorted[column]
+        start = np.searchsorted(sorted_values, low, side='left')
+        stop = np.searchsorted(sorted_values, high, side='right')
+        return order[start:stop]
+
+    def _category_candidates(self, column, values):
+        positions = [self._positions[column][value] for value in values if value in self._positions[column]]
+        return np.concatenate(positions) if positions else np.empty(0, dtype=np.intp)
+
+    # Zeilenpositionen (aufsteigend) für Bereiche {Spalte: (von, bis)} und
+    # Kategorien {Spalte: [Werte]}; leere Wertelisten schränken nicht ein
+    def positions(self, ranges=None, categories=None):
+        ranges = {column: (low, high) for column, (low, high) in (ranges or {}).items()}
+        categories = {column: tuple(sorted(values)) for column, values in (categories or {}).items() if len(values)}
+        key = (tuple(sorted(ranges.items())), tuple(sorted(categories.items())))
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        messung.cache_event('fahrzeugfilter.positions', cached is not None)
+        if cached is not None:
+            return cached
+
+        # Kleinste Kandidatenmenge bestimmen
+        candidate_sets = [(('range', column), self._range_candidates(column, *bounds)) for column, bounds in ranges.items()]
+        candidate_sets += [(('category', column), self._category_candidates(column, values)) for column, values in categories.items()]
+        if candidate_sets:
+            chosen, candidates = min(candidate_sets, key=lambda item: len(item[1]))
+        else:
+            chosen, candidates = None, np.arange(len(self.data))
+
+        # Übrige Bedingungen nur auf den Kandidaten prüfen
+        keep = np.ones(len(candidates), dtype=bool)
+        for column, (low, high) in ranges.items():
+            if chosen != ('range', column):
+                values = self._sorted[column][0][candidates]
+                keep &= (values >= low) & (values <= high)
+        for column, values in categories.items():
+            if chosen != ('category', column):
+                codes, lookup = self._codes[column]
+                wanted = [lookup[value] for value in values if value in lookup]
+                keep &= np.isin(codes[candidates], wanted)
+        result = np.sort(candidates[keep])
+        result.flags.writeable = False
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    # Gefilterte Zeilen in der ursprünglichen Reihenfolge der Tabelle
+    def filter(self, ranges=None, categories=None):
+        return self.data.iloc[self.positions(ranges, categories)]
@@ -1,41 +1,65 @@
-import streamlit as st
+import importlib
+
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib import widgets
-
-import einleitung
-import browser
-import batterie
-import EV_auto  
-import ladestation
-import energie
-import sale
-
-# Definieren der Seiten
+import streamlit as st
+
+import aufwaermen
+import daten
+import messung
+
+# Definieren der Seiten (Modulnamen; ein Modul wird erst importiert, wenn die Seite gewählt wird)
 pages = {
-    "1. Einleitung": einleitung,
-    "2. Verkauf": sale,
-    "3. Energie": energie,
-    "4. Ladestationen": ladestation,
-    "5. Elektroautos": EV_auto,  
-    "6. Elektroauto-Browser": browser,
+    "1. Einleitung": "einleitung",
+    "2. Verkauf": "sale",
+    "3. Energie": "energie",
+    "4. Ladestationen": "ladestation",
+    "5. Elektroautos": "EV_auto",
+    "6. Elektroauto-Browser": "browser",
+}
+
+# Zusätzliche Unterseiten der Seite 'Elektroautos'
+sub_pages = {
+    "Elektroauto": "EV_auto",
+    "Batterie": "batterie",
 }
 
+
+# Importieren der Seite erst bei Bedarf
+def load_page(module_name):
+    return importlib.import_module(module_name)
+
+
+# Zwischenspeicher aus dem vorberechneten Artefaktbündel übernehmen, falls es zu den Quelldateien passt
+daten.active_bundle()
+
+# Die Excel-Schnappschüsse im Hintergrund vorbereiten, während die erste Seite gezeichnet wird
+daten.start_background_load()
+
+# Alle Datensätze und Modelle einmal pro Prozess parallel vorbereiten (abschaltbar mit EV_WARMUP=0);
+# bis dahin laden die Seiten bei Bedarf selbst
+aufwaermen.start()
+
 # Einrichten der Seitenleiste
 st.sidebar.title("Ära der Elektroautos: Analyse, Trends und Zukunft der Mobilität")
 select = st.sidebar.radio("Bitte wählen Sie eine Ansicht aus:", list(pages.keys()))
 
 # Überprüfung der Auswahl der Seite 'Elektroautos' und zusätzliche Optionen
 if select == "5. Elektroautos":
-    additional_option = st.sidebar.radio("Weitere Optionen:", ["Elektroauto", "Batterie"])
-    if additional_option == "Elektroauto":
-        # Code zur Anzeige von Elektroauto
-        EV_auto.app()  # Aufruf der Funktion app() aus dem Modul 'EV_auto' zur Anzeige von Elektroauto
-    elif additional_option == "Batterie":
-        # Code zur Anzeige von Batteriedaten
-        batterie.app()  # Aufruf der Funktion app() aus dem Modul 'batterie' zur Anzeige von Batteriedaten
-    else:
-        pages[select].app()  # Wenn der Benutzer eine andere Option auswählt, wird die ausgewählte Seite angezeigt
+    additional_option = st.sidebar.radio("Weitere Optionen:", list(sub_pages.keys()))
+    # Aufruf der Funktion app() aus dem Modul 'EV_auto' bzw. 'batterie'
+    module_name = sub_pages[additional_option]
 else:
-    pages[select].app()  # Wenn der Benutzer eine andere Seite auswählt, wird die ausgewählte Seite angezeigt
+    module_name = pages[select]  # Wenn der Benutzer eine andere Seite auswählt, wird die ausgewählte Seite angezeigt
+
+# Jeder Seitenaufruf ist ein Span; bei eingeschalteter Messung (EV_TRACE=1) zeigt die
+# Seitenleiste die Zeiten dieses Aufrufs und die Treffer der Zwischenspeicher
+with messung.span('seite', page=module_name) as run:
+    load_page(module_name).app()
+
+if run is not None:
+    with st.sidebar.expander("Debug: Laufzeiten"):
+        st.dataframe(pd.DataFrame([{'Stufe': ' ' * depth + name, 'ms': round(duration, 1), 'Cache': cache}
+                                   for depth, name, duration, cache in messung.breakdown(run)]), hide_index=True)
+        counters = messung.cache_counters()
+        if counters:
+            st.dataframe(pd.DataFrame.from_dict(counters, orient='index').rename_axis('Zwischenspeicher').reset_index(), hide_index=True)
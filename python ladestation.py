@@ -3,40 +3,88 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 
-# Laden und Vorbereiten der Daten
-@st.cache_data
-def load_data():
-    # Laden historischer Ladedaten
-    historical_data_path = 'IEA-EV-dataEV charging pointsHistoricalEV (1).csv'
-    historical_data = pd.read_csv(historical_data_path)
-    
-    # Laden von Prognosedaten für Ladesäulen
-    projection_data_path = 'IEA-EV-dataEV charging pointsProjection-STEPSEV.csv'
-    projection_data = pd.read_csv(projection_data_path)
-    
-    # Laden von EV-Verkaufsdaten
-    sales_data_path = 'EV data history.csv'
-    sales_data = pd.read_csv(sales_data_path)
-    
-    # Kombinieren und Filtern von historischen und prognostizierten Daten
-    combined_data = pd.concat([historical_data, projection_data])
-    filtered_data = combined_data[combined_data['year'] >= 2010]
-    
-    # Aggregieren von globalen und länderspezifischen Daten
-    global_data = filtered_data.groupby(['year']).sum().reset_index()
-    country_data = filtered_data.groupby(['region', 'year']).sum().reset_index()
+import abfrage
+import daten
+import messung
+import szenarien
+import trend
+import verknuepfung
+import wuerfel
+
+# Datensätze der Ladepunkte in der Reihenfolge ihres Vorrangs: in den Jahren, für die beide
+# Werte haben (2020–2022), zählen die historischen statt der STEPS-Prognose
+CHARGER_DATASETS = ['charging_points_historical', 'charging_points_steps']
+
+
+# Je Region und Jahr nur die Zeilen des ersten Datensatzes aus CHARGER_DATASETS, der Werte hat
+def _one_dataset_per_year(chargers):
+    parts, seen = [], None
+    for dataset in CHARGER_DATASETS:
+        part = chargers[chargers['dataset'] == dataset]
+        keys = pd.MultiIndex.from_frame(part[['region', 'year']])
+        if seen is not None:
+            part, keys = part[~keys.isin(seen)], keys[~keys.isin(seen)]
+        parts.append(part)
+        seen = keys if seen is None else seen.append(keys)
+    return pd.concat(parts)
+
+# Vorbereiten der Daten aus dem Aggregatwürfel
+def build_data():
+    # Alle Summen kommen aus dem vorberechneten Aggregatwürfel
+    cube = wuerfel.cube_query()
+
+    # Historische und prognostizierte Ladepunkte, summiert über alle Ladetypen
+    chargers = cube.select(dataset=CHARGER_DATASETS, parameter='EV charging points',
+                           powertrain=wuerfel.TOTAL, year=(2010, None))
+    chargers = _one_dataset_per_year(chargers)
     
-    # Filtern und Aggregieren von EV-Verkaufsdaten
-    sales_data_filtered = sales_data[(sales_data['parameter'] == 'EV sales') & (sales_data['year'] >= 2010)]
-    sales_aggregated = sales_data_filtered.groupby(['region', 'year']).sum().reset_index()
+    # Globale und länderspezifische Daten (historisch, danach prognostiziert)
+    # Der Würfel ist kompakt (Kategorien, int16-Jahre); observed=True gruppiert nur vorkommende Regionen
+    global_data = chargers[chargers['region'] == wuerfel.TOTAL].groupby('year')['sum'].sum().reset_index(name='value')
+    country_data = chargers[chargers['region'] != wuerfel.TOTAL].groupby(['region', 'year'], observed=True)['sum'].sum().reset_index(name='value')
     
-    # Verknüpfen von EV-Verkäufen und Anzahl der Ladegeräte
-    combined_sales_chargers = pd.merge(sales_aggregated, country_data, on=['region', 'year'], suffixes=('_sales', '_chargers'))
+    # EV-Verkäufe und Anzahl der Ladegeräte je Region und Jahr aus dem gemeinsamen Verknüpfungsindex (ohne Merge)
+    combined_sales_chargers = verknuepfung.load_index().frame(['sales', 'chargers'], years=(2010, None))
+    combined_sales_chargers = combined_sales_chargers.rename(columns={'sales': 'value_sales', 'chargers': 'value_chargers'})
     
     return global_data, country_data, combined_sales_chargers
 
+# Laden der Daten (einmal pro Datenstand, von allen Sitzungen geteilt), vorberechnet aus dem Artefaktbündel
+@messung.traced_cache(st.cache_resource)
+def load_data(version):
+    return daten.artifact('ladestation', build_data)
+
+# Abfrageobjekt über den Länderdaten, damit die Länderauswahl nicht die ganze Tabelle filtert
+@messung.traced_cache(st.cache_resource)
+def load_country_query(version):
+    return abfrage.IEAQuery(load_data(version)[1], keys=['region', 'year'])
+
+# Fragment für die Länderauswahl; nur dieses Diagramm wird bei einer neuen Auswahl neu gezeichnet
+@st.fragment
+def show_country_chargers(country_data, version):
+    selected_country = st.selectbox('Bitte wählen Sie ein Land aus:', country_data['region'].unique())
+    filtered_country_data = load_country_query(version).select(region=selected_country)
+    fig_country = px.line(filtered_country_data, x='year', y='value', title=f'Anzahl der Ladestationen für Elektrofahrzeuge in {selected_country} im Laufe der Jahre')
+    st.plotly_chart(fig_country)
+
+# Fragment für das Korrelationsdiagramm; die Auswahl der Trendlinie zeichnet nur dieses neu
+@st.fragment
+def show_correlation(combined_sales_chargers):
+    # Pearson-Korrelation und Trendlinie(n) in geschlossener Form, optional je Region
+    chargers, sales = verknuepfung.load_index().values(['chargers', 'sales'], years=(2010, None))
+    correlation_value = trend.linear_fit(chargers, sales)['pearson_r'].iloc[0]
+    fig_correlation = px.scatter(combined_sales_chargers, x='value_chargers', y='value_sales', 
+                                 labels={'value_chargers': 'Die Ladegeräteanzahl', 'value_sales': 'Verkauf von EV'},
+                                 title=f'Die Korrelation zwischen dem Verkauf von Elektrofahrzeugen und der Anzahl der Ladestationen (Pearson: {correlation_value:.2f})')
+    per_region = st.checkbox('Trendlinie je Region anzeigen')
+    trend.add_trendline(fig_correlation, combined_sales_chargers['value_chargers'], combined_sales_chargers['value_sales'],
+                        groups=combined_sales_chargers['region'] if per_region else None)
+    st.plotly_chart(fig_correlation)
+
 def app():
-    global_data, country_data, combined_sales_chargers = load_data()
+    # Datenstand der IEA-Dateien; nach einem Austausch der Dateien werden alle Tabellen neu geladen
+    version = daten.dataset_version(daten.IEA_DATEIEN)
+    global_data, country_data, combined_sales_chargers = load_data(version)
 
     # Visualisierungen und Interaktivität
     st.title('Analyse und Visualisierung von Elektrofahrzeug-Ladegeräten (EV) und EV-Verkäufen')
@@ -48,20 +96,24 @@ def app():
 
     # Interaktive Darstellung nach Ländern für Ladestationen
     st.header('Die Anzahl von Ladestationen für Elektrofahrzeuge nach Ländern')
-    selected_country = st.selectbox('Bitte wählen Sie ein Land aus:', country_data['region'].unique())
-    filtered_country_data = country_data[country_data['region'] == selected_country]
-    fig_country = px.line(filtered_country_data, x='year', y='value', title=f'Anzahl der Ladestationen für Elektrofahrzeuge in {selected_country} im Laufe der Jahre')
-    st.plotly_chart(fig_country)
+    show_country_chargers(country_data, version)
+
+    # Historische Ladepunkte, fortgeschrieben mit der Projektion (STEPS), aus der Szenario-Engine
+    st.header('Ladestationen bis 2030: historische Werte und Projektion')
+    engine = szenarien.load_engine()
+    projection = engine.series('EV charging points', region=engine.projection_regions('EV charging points'),
+                               scenario=szenarien.REFERENCE, kind='stitched')
+    growth = engine.series('EV charging points', scenario=szenarien.REFERENCE, kind='growth', years=(engine.years[-1], None))
+    fig_projection = px.line(projection, x='year', y='value', color='region', markers=True,
+                             title=f'Ladepunkte je Region, ab dem letzten historischen Jahr im Szenario {szenarien.REFERENCE}',
+                             labels={'value': 'Anzahl der Ladepunkte', 'year': 'Jahr', 'region': 'Region'})
+    st.plotly_chart(fig_projection)
+    if not growth.empty:
+        st.caption(f'Jährliches Wachstum bis {engine.years[-1]}: ' + ', '.join(f'{row.region} {row.value:.1%}' for row in growth.itertuples()))
 
     # Analyse der Korrelation zwischen EV-Verkäufen und Ladestationen
     st.header('Die Korrelation zwischen dem Verkauf von Elektrofahrzeugen und der Anzahl der Ladestationen')
-    correlation_matrix = combined_sales_chargers[['value_sales', 'value_chargers']].corr()
-    correlation_value = correlation_matrix.loc['value_sales', 'value_chargers']
-    fig_correlation = px.scatter(combined_sales_chargers, x='value_chargers', y='value_sales', 
-                                 trendline='ols', 
-                                 labels={'value_chargers': 'Die Ladegeräteanzahl', 'value_sales': 'Verkauf von EV'},
-                                 title=f'Die Korrelation zwischen dem Verkauf von Elektrofahrzeugen und der Anzahl der Ladestationen (Pearson: {correlation_value:.2f})')
-    st.plotly_chart(fig_correlation)
+    show_correlation(combined_sales_chargers)
 
 if __name__ == '__main__':
     app()
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Startseite der App und Wartezeit je Rerun (Sekunden)
+HOME_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'home_page.py')
+RERUN_TIMEOUT = 300
+
+# Stufen gleichzeitiger Sitzungen und Durchläufe des Szenarios je Sitzung
+CONCURRENCY = [1, 2, 4, 8, 16]
+ITERATIONS = 2
+
+# Beschriftungen der Widgets, die das Szenario bedient
+PAGE_RADIO = "Bitte wählen Sie eine Ansicht aus:"
+PRICE_SLIDER = 'Filtern nach Preis (Euro):'
+COUNTRY_SELECT = 'Bitte wählen Sie ein Land aus:'
+POWERTRAIN_SELECT = "Bitte wählen Sie den Antriebstyp aus:"
+
+
+def _widget(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f'Kein Widget mit der Beschriftung {label!r}')
+
+
+def _page(app_test, page):
+    _widget(app_test.sidebar.radio, PAGE_RADIO).set_value(page)
+
+
+def _price(app_test, rng):
+    slider = _widget(app_test.sidebar.slider, PRICE_SLIDER)
+    low, high = slider.min, slider.max
+    upper = int(low + (high - low) * rng.uniform(0.3, 1.0))
+    slider.set_value((low, upper))
+
+
+def _country(app_test, rng):
+    select = _widget(app_test.selectbox, COUNTRY_SELECT)
+    select.set_value(rng.choice(select.options))
+
+
+def _powertrain(app_test, rng):
+    select = _widget(app_test.selectbox, POWERTRAIN_SELECT)
+    select.set_value(rng.choice(select.options))
+
+
+# Typische Navigation einer Sitzung: (Name des Schritts, Aktion vor dem Rerun)
+SCENARIO = [
+    ('start', None),
+    ('verkauf', lambda app_test, rng: _page(app_test, "2. Verkauf")),
+    ('verkauf_antrieb', _powertrain),
+    ('energie', lambda app_test, rng: _page(app_test, "3. Energie")),
+    ('ladestationen', lambda app_test, rng: _page(app_test, "4. Ladestationen")),
+    ('ladestationen_land', _country),
+    ('ladestationen_land', _country),
+    ('browser', lambda app_test, rng: _page(app_test, "6. Elektroauto-Browser")),
+    ('browser_preis', _price),
+    ('browser_preis', _price),
+    ('elektroautos', lambda app_test, rng: _page(app_test, "5. Elektroautos")),
+]
+
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        return None
+
+
+def _peak_rss_mb():
+    # ru_maxrss ist unter Linux in KiB, unter macOS in Bytes angegeben
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# Eine Sitzung: das Szenario iterations-mal durchlaufen, jede Rerun-Dauer messen
+def run_session(session, iterations, seed, start_barrier=None):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed + session)
+    app_test = AppTest.from_file(HOME_PAGE, default_timeout=RERUN_TIMEOUT)
+    samples, errors = [], []
+    if start_barrier is not None:
+        start_barrier.wait()
+    for iteration in range(iterations):
+        for step, action in SCENARIO:
+            if step == 'start' and iteration:
+                continue
+            try:
+                if action is not None:
+                    action(app_test, rng)
+                start = time.perf_counter()
+                app_test.run()
+                samples.append((step, time.perf_counter() - start))
+                errors.extend(f'{step}: {exception.value}' for exception in app_test.exception)
+            except Exception as error:
+                errors.append(f'{step}: {type(error).__name__}: {error}')
+    return samples, errors
+
+
+def _percentiles(latencies):
+    if not len(latencies):
+        return {}
+    values = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {'p50_ms': round(values[0], 1), 'p95_ms': round(values[1], 1), 'p99_ms': round(values[2], 1),
+            'max_ms': round(float(np.max(latencies)) * 1000, 1)}
+
+
+# Eine Laststufe: concurrency Sitzungen gleichzeitig in Threads desselben Prozesses,
+# wie beim Streamlit-Server (gemeinsame Zwischenspeicher, ein Interpreter)
+def run_level(concurrency, iterations, seed):
+    barrier = threading.Barrier(concurrency)
+    rss_before = _current_rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda session: run_session(session, iterations, seed, barrier), range(concurrency)))
+    wall = time.perf_counter() - start
+    rss_after = _current_rss_mb()
+
+    samples = [sample for session_samples, _ in results for sample in session_samples]
+    errors = [error for _, session_errors in results for error in session_errors]
+    latencies = np.array([duration for _, duration in samples])
+    steps = {}
+    for step in dict.fromkeys(step for step, _ in samples):
+        steps[step] = _percentiles(np.array([duration for name, duration in samples if name == step]))
+    memory_per_session = None
+    if rss_before is not None and rss_after is not None:
+        memory_per_session = round((rss_after - rss_before) / concurrency, 1)
+    return {
+        'concurrency': concurrency,
+        'reruns': len(samples),
+        'wall_s': round(wall, 2),
+        'throughput_rps': round(len(samples) / wall, 2) if wall else None,
+        'latency': _percentiles(latencies),
+        'steps': steps,
+        'rss_mb': round(rss_after, 1) if rss_after is not None else None,
+        'memory_per_session_mb': memory_per_session,
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'errors': errors[:20],
+        'error_count': len(errors),
+    }
+
+
+# Schaltet das Aufwärmen beim Serverstart (aufwaermen) ab. home_page startet es sonst beim
+# ersten Aufruf, und seine Threads und Prozesspools liefen während der Messung mit.
+def disable_server_warmup():
+    os.environ['EV_WARMUP'] = '0'
+    if 'aufwaermen' in sys.modules:
+        sys.modules['aufwaermen'].ENABLED = False
+
+
+def run_load_test(levels=CONCURRENCY, iterations=ITERATIONS, seed=0, warmup=True, log=print):
+    disable_server_warmup()
+    if warmup:
+        # Ein Durchlauf vorab füllt die prozessweiten Zwischenspeicher wie auf einem laufenden Server
+        run_session(0, 1, seed)
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'iterations': iterations,
+            'scenario': [step for step, _ in SCENARIO],
+            'warmup': warmup,
+            'server_warmup': False,
+        },
+        'levels': [],
+    }
+    for concurrency in levels:
+        level = run_level(concurrency, iterations, seed)
+        report['levels'].append(level)
+        log(f"{concurrency:>4} Sitzungen: p50 {level['latency'].get('p50_ms')} ms, p95 {level['latency'].get('p95_ms')} ms, "
+            f"p99 {level['latency'].get('p99_ms')} ms, {level['throughput_rps']} Reruns/s, "
+            f"{level['memory_per_session_mb']} MB/Sitzung, {level['error_count']} Fehler")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Lasttest: viele gleichzeitige Sitzungen auf home_page.py')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=CONCURRENCY)
+    parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-warmup', action='store_true', help='ohne vorherigen Durchlauf (kalte Zwischenspeicher)')
+    parser.add_argument('--output', help='JSON-Ergebnisdatei (Standard: Ausgabe auf stdout)')
+    args = parser.parse_args(argv)
+
+    log = (lambda message: print(message, file=sys.stderr))
+    report = run_load_test(args.concurrency, args.iterations, args.seed, not args.no_warmup, log)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
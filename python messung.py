@@ -0,0 +1,208 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# Messung ist standardmäßig aus. EV_TRACE=1 schaltet sie ein; ohne Messung geben die
+# Dekoratoren die Funktionen unverändert zurück, und span() ist ein leerer Kontext.
+ENABLED = os.environ.get('EV_TRACE', '').lower() not in ('', '0', 'false', 'no')
+
+# Exportdatei (eine JSON-Zeile je Span bzw. je Trace) und Format:
+# 'jsonl' = strukturierte Logzeilen, 'otlp' = OpenTelemetry-OTLP/JSON (wie der Datei-Exporter des Collectors)
+TRACE_FILE = os.environ.get('EV_TRACE_FILE')
+TRACE_FORMAT = os.environ.get('EV_TRACE_FORMAT', 'jsonl').lower()
+
+# Dienstname in den exportierten Traces
+SERVICE_NAME = 'ev-analyse'
+
+_current = contextvars.ContextVar('messung_span', default=None)
+_counters = Counter()
+_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent', 'start_ns', 'end_ns', 'children', '_token')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.parent = _current.get()
+        self.trace_id = self.parent.trace_id if self.parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.children = []
+        self.start_ns = self.end_ns = None
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        if self.parent is not None:
+            self.parent.children.append(self)
+        else:
+            _export(self)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+# Zeitspanne um einen Abschnitt: with messung.span('sale.groupby', rows=len(data)): ...
+def span(name, **attributes):
+    if not ENABLED:
+        return _NO_SPAN
+    return Span(name, attributes)
+
+
+# Dekorator: jeder Aufruf der Funktion wird als Span aufgezeichnet
+def traced(name=None):
+    def decorator(function):
+        if not ENABLED:
+            return function
+        span_name = name or f'{function.__module__}.{function.__qualname__}'
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(span_name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Ersatz für @st.cache_data / @st.cache_resource, der zusätzlich Treffer und Fehlschläge
+# des Streamlit-Zwischenspeichers zählt: der innere Teil läuft nur bei einem Fehlschlag
+def traced_cache(cache_decorator, name=None):
+    def decorator(function):
+        if not ENABLED:
+            return cache_decorator(function)
+        span_name = name or f'{function.__module__}.{function.__qualname__}'
+
+        @functools.wraps(function)
+        def on_miss(*args, **kwargs):
+            current = _current.get()
+            if current is not None:
+                current.attributes['cache'] = 'miss'
+            return function(*args, **kwargs)
+
+        cached = cache_decorator(on_miss)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(span_name, {}) as current:
+                result = cached(*args, **kwargs)
+            cache_event(span_name, current.attributes.setdefault('cache', 'hit') == 'hit')
+            return result
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorator
+
+
+# Zählt einen Treffer (hit=True) oder Fehlschlag eines Zwischenspeichers
+def cache_event(name, hit):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[(name, 'hit' if hit else 'miss')] += 1
+    current = _current.get()
+    if current is not None:
+        current.attributes[f'cache.{name}'] = 'hit' if hit else 'miss'
+
+
+# Zählerstände als {Name: {'hit': n, 'miss': n}}
+def cache_counters():
+    with _lock:
+        items = list(_counters.items())
+    counters = {}
+    for (name, kind), count in sorted(items):
+        counters.setdefault(name, {'hit': 0, 'miss': 0})[kind] = count
+    return counters
+
+
+# Flache Aufschlüsselung eines beendeten Spans und aller Unter-Spans:
+# Liste von (Tiefe, Name, Dauer in ms, Zwischenspeicher-Attribut)
+def breakdown(span):
+    return [(depth, item.name, item.duration_ms, item.attributes.get('cache', '')) for depth, item in _walk(span)]
+
+
+def _walk(span, depth=0):
+    yield depth, span
+    for child in span.children:
+        yield from _walk(child, depth + 1)
+
+
+def _export(root):
+    if not TRACE_FILE:
+        return
+    if TRACE_FORMAT == 'otlp':
+        lines = [json.dumps(_otlp(root))]
+    else:
+        lines = [json.dumps(_log_record(item)) for _, item in _walk(root)]
+    with _lock, open(TRACE_FILE, 'a', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def _log_record(span):
+    return {
+        'name': span.name,
+        'trace_id': span.trace_id,
+        'span_id': span.span_id,
+        'parent_id': span.parent.span_id if span.parent is not None else None,
+        'start_ns': span.start_ns,
+        'duration_ms': round(span.duration_ms, 3),
+        'thread': threading.current_thread().name,
+        'pid': os.getpid(),
+        'attributes': span.attributes,
+    }
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp(root):
+    spans = []
+    for _, item in _walk(root):
+        spans.append({
+            'traceId': item.trace_id,
+            'spanId': item.span_id,
+            'parentSpanId': item.parent.span_id if item.parent is not None else '',
+            'name': item.name,
+            'kind': 1,
+            'startTimeUnixNano': str(item.start_ns),
+            'endTimeUnixNano': str(item.end_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in item.attributes.items()],
+            'status': {'code': 2} if 'error' in item.attributes else {},
+        })
+    return {'resourceSpans': [{
+        'resource': {'attributes': [
+            {'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+            {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+        ]},
+        'scopeSpans': [{'scope': {'name': 'messung'}, 'spans': spans}],
+    }]}
@@ -0,0 +1,257 @@
+import glob
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+import aktualisierung
+import daten
+import messung
+
+# Verzeichnis für die mit joblib gespeicherten Modelle
+MODEL_DIR = os.path.join(daten.CACHE_DIR, 'modelle')
+
+# Maximale Anzahl trainierter Modelle im Arbeitsspeicher (LRU)
+MAX_MODELS_IN_MEMORY = 32
+
+_models = OrderedDict()
+_lock = threading.Lock()
+
+
+# Schlüssel aus Modelltyp, Hyperparametern und dem Inhalt der Trainingsdaten
+def model_key(model_class, params, X, y, future_X):
+    digest = hashlib.sha256()
+    digest.update(f'{model_class.__module__}.{model_class.__name__}'.encode())
+    digest.update(repr(sorted(params.items())).encode())
+    for array in (X, y, future_X):
+        array = np.ascontiguousarray(array)
+        digest.update(f'{array.dtype}{array.shape}'.encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _remember(key, entry):
+    with _lock:
+        _models[key] = entry
+        _models.move_to_end(key)
+        while len(_models) > MAX_MODELS_IN_MEMORY:
+            _models.popitem(last=False)
+
+
+def _lookup(key):
+    with _lock:
+        entry = _models.get(key)
+        if entry is not None:
+            _models.move_to_end(key)
+        return entry
+
+
+# Trainiert ein Modell und liefert (Modell, Vorhersagen) für future_X.
+# Ergebnisse werden erst im Speicher, dann auf der Festplatte gesucht; nur wenn beides
+# fehlt, wird das Modell neu trainiert und anschließend gespeichert.
+def fit_and_predict(model_class, params, X, y, future_X):
+    key = model_key(model_class, params, X, y, future_X)
+    entry = _lookup(key)
+    messung.cache_event('prognose.memory', entry is not None)
+    if entry is not None:
+        return entry
+
+    path = os.path.join(MODEL_DIR, key + '.joblib')
+    try:
+        entry = joblib.load(path)
+        messung.cache_event('prognose.disk', True)
+    except Exception as error:
+        messung.cache_event('prognose.disk', False)
+        # Beschädigte oder mit einer anderen Version gespeicherte Modelle verwerfen und neu trainieren;
+        # das Entpickeln solcher Dateien kann fast jede Ausnahme auslösen (UnpicklingError,
+        # AttributeError, ModuleNotFoundError, KeyError, ...)
+        if not isinstance(error, FileNotFoundError) and os.path.exists(path):
+            os.remove(path)
+        with messung.span('prognose.fit', model=model_class.__name__, rows=len(X)):
+            model = model_class(**params)
+            model.fit(X, y)
+            entry = (model, model.predict(future_X))
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        joblib.dump(entry, tmp_path)
+        os.replace(tmp_path, path)
+
+    _remember(key, entry)
+    return entry
+
+
+# Letztes Jahr aller Prognosen
+FORECAST_END_YEAR = 2030
+
+
+# Jahr × Reihe-Matrix eines Parameters; jede Spalte ist eine (Region, Antriebsart)-Reihe,
+# fehlende Jahre sind NaN
+def series_matrix(data, parameter='EV sales'):
+    subset = data[data['parameter'] == parameter]
+    return subset.pivot_table(index='year', columns=['region', 'powertrain'], values='value', aggfunc='sum')
+
+
+# Lineare Trends für alle Reihen in einem Schritt: die Normalgleichungen der kleinsten
+# Quadrate werden spaltenweise über die ganze Matrix gelöst (Lücken werden maskiert)
+def linear_trends(matrix):
+    years = matrix.index.to_numpy(dtype=float)[:, None]
+    values = matrix.to_numpy(dtype=float)
+    mask = ~np.isnan(values)
+    x = np.where(mask, years, 0.0)
+    y = np.where(mask, values, 0.0)
+
+    n = mask.sum(axis=0)
+    sum_x = x.sum(axis=0)
+    sum_y = y.sum(axis=0)
+    sum_xx = (x * x).sum(axis=0)
+    sum_xy = (x * y).sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = n * sum_xx - sum_x ** 2
+        # Reihen mit nur einem Jahr erhalten wie bei LinearRegression die Steigung 0
+        slope = np.where(denominator > 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        intercept = (sum_y - slope * sum_x) / n
+    return slope, intercept
+
+
+# Einzelne Wälder werden nicht gespeichert; gespeichert wird die ganze Prognosetabelle
+def _forest_predictions(args):
+    X, y, future_X, params = args
+    return RandomForestRegressor(**params).fit(X, y).predict(future_X)
+
+
+# Random-Forest-Prognosen für mehrere Reihen, verteilt auf einen Prozesspool.
+# 'spawn' statt 'fork', weil der Streamlit-Server zu diesem Zeitpunkt bereits Threads hat.
+def forest_predictions(jobs, params, max_workers=None):
+    if len(jobs) <= 1:
+        return [_forest_predictions(job + (params,)) for job in jobs]
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        return list(pool.map(_forest_predictions, [job + (params,) for job in jobs]))
+
+
+# Eine Prognosetabelle (region, powertrain, year, model, value) für alle Reihen eines Parameters.
+# Jede Reihe wird ab ihrem ersten beobachteten Jahr bis FORECAST_END_YEAR fortgeschrieben.
+@messung.traced()
+def forecast_table(data, parameter='EV sales', end_year=FORECAST_END_YEAR, random_forest=False, rf_params=None, max_workers=None):
+    matrix = series_matrix(data, parameter)
+    future_years = np.arange(int(matrix.index.min()), end_year + 1)
+    first_year = matrix.apply(lambda column: column.first_valid_index()).to_numpy()
+
+    slope, intercept = linear_trends(matrix)
+    linear = intercept[None, :] + slope[None, :] * future_years[:, None]
+    frames = [_tidy(matrix.columns, future_years, linear, 'Lineare Regression')]
+
+    if random_forest:
+        params = rf_params or {'n_estimators': 200, 'random_state': 42}
+        future_X = future_years.reshape(-1, 1)
+        jobs = []
+        for column in matrix.columns:
+            series = matrix[column].dropna()
+            jobs.append((series.index.to_numpy().reshape(-1, 1), series.to_numpy(), future_X))
+        forest = np.column_stack(forest_predictions(jobs, params, max_workers))
+        frames.append(_tidy(matrix.columns, future_years, forest, 'Random Forest'))
+
+    table = pd.concat(frames, ignore_index=True)
+    starts = pd.Series(first_year, index=matrix.columns)
+    table_start = starts.reindex(pd.MultiIndex.from_frame(table[['region', 'powertrain']])).to_numpy()
+    return table[table['year'].to_numpy() >= table_start].reset_index(drop=True)
+
+
+# Ersetzt in einer bestehenden Prognosetabelle die Reihen der angegebenen Regionen durch
+# neu berechnete; alle übrigen Reihen bleiben unverändert
+def update_forecast_table(table, data, regions, parameter='EV sales', **options):
+    if not len(regions):
+        return table
+    keep = table[~table['region'].isin(regions)]
+    subset = data[data['region'].isin(regions) & (data['parameter'] == parameter)]
+    if subset.empty:
+        return keep.reset_index(drop=True)
+    return pd.concat([keep, forecast_table(subset, parameter, **options)], ignore_index=True)
+
+
+def _forecast_path(name, parameter, source_hash, random_forest=False):
+    slug = parameter.replace(' ', '_') + ('-rf' if random_forest else '')
+    return os.path.join(daten.CACHE_DIR, f'prognose-{name}-{slug}-{source_hash}{daten.CACHE_SUFFIX}')
+
+
+def _table_hash(path):
+    return path[:-len(daten.CACHE_SUFFIX)].rsplit('-', 1)[1]
+
+
+# Gespeicherte Tabellen älterer Stände derselben Art (mit oder ohne Random Forest)
+def _older_tables(name, parameter, path, random_forest):
+    return [old_path for old_path in glob.glob(_forecast_path(name, parameter, '*', random_forest))
+            if old_path != path and _forecast_path(name, parameter, _table_hash(old_path), random_forest) == old_path]
+
+
+# Liegt die Prognosetabelle zum aktuellen Stand der Quelldatei bereits auf der Festplatte?
+def has_forecast_table(name, parameter='EV sales', random_forest=False):
+    source_hash = daten.content_hash(daten.IEA_DATEIEN[name])
+    return daten.pyarrow is not None and os.path.exists(_forecast_path(name, parameter, source_hash, random_forest))
+
+
+# Zeilen eines Parameters, gestreamt gelesen (daten.scan_iea) und mit Text- statt
+# Kategoriespalten wie in den Datenbeständen von daten.load_iea
+def _parameter_rows(name, parameter):
+    data = daten.scan_iea(name, parameter=parameter)
+    return data.astype({column: dtype for column, dtype in daten.IEA_DTYPES.items() if dtype is str})
+
+
+# Prognosetabelle eines IEA-Datensatzes, auf der Festplatte je Dateiinhalt gespeichert.
+# Gelesen werden nur die Zeilen des Parameters, nicht der ganze Datensatz.
+# Bei einem neuen Stand der Quelldatei werden nur die Regionen neu berechnet, deren
+# Partitionen (region, year, parameter) sich geändert haben. Mit random_forest enthält
+# die Tabelle zusätzlich die Random-Forest-Prognosen aller Reihen (Prozesspool).
+@messung.traced()
+def load_forecast_table(name, parameter='EV sales', random_forest=False):
+    source_hash = daten.content_hash(daten.IEA_DATEIEN[name])
+    path = _forecast_path(name, parameter, source_hash, random_forest)
+    messung.cache_event('prognose.table', os.path.exists(path))
+    if daten.pyarrow is None:
+        return forecast_table(_parameter_rows(name, parameter), parameter, random_forest=random_forest)
+    if os.path.exists(path):
+        return daten.read_frame(path)
+
+    data = _parameter_rows(name, parameter)
+    table = None
+    older = _older_tables(name, parameter, path, random_forest)
+    if older:
+        old_path = max(older, key=os.path.getmtime)
+        old_data = daten.read_payload(_table_hash(old_path))
+        if old_data is not None:
+            old_data = old_data[old_data['parameter'] == parameter]
+            partitions = aktualisierung.changed_partitions(old_data, data)
+            regions = aktualisierung.changed_regions(partitions, parameter)
+            table = update_forecast_table(daten.read_frame(old_path), data, regions, parameter, random_forest=random_forest)
+    if table is None:
+        table = forecast_table(data, parameter, random_forest=random_forest)
+
+    daten.write_frame(table, path)
+    for old_path in older:
+        os.remove(old_path)
+    return table
+
+
+def _tidy(columns, years, values, model_name):
+    n_years, n_series = values.shape
+    return pd.DataFrame({
+        'region': np.tile(columns.get_level_values('region'), n_years),
+        'powertrain': np.tile(columns.get_level_values('powertrain'), n_years),
+        'year': np.repeat(years, n_series),
+        'model': model_name,
+        'value': values.ravel(),
+    })
+
+
+# Auswahl einer Reihe aus der Prognosetabelle
+def forecast_for(table, region, powertrain, model='Lineare Regression'):
+    selection = table[(table['region'] == region) & (table['powertrain'] == powertrain) & (table['model'] == model)]
+    return selection[['year', 'value']]
@@ -1,38 +1,103 @@
+import threading
+
 import streamlit as st
-import pandas as pd
 import numpy as np
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor  
-import plotly.express as px
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 
-@st.cache_data
-def load_data():
-    data = pd.read_csv("EV data history.csv")
-    #data_wo_pop = pd.read_csv("world_population.csv")
-    return data
+import abbildungen
+import abfrage
+import darstellung
+import daten
+import messung
+import prognose
+
+# Parameter, die auf dieser Seite gezeigt werden
+SALE_PARAMETERS = ['EV sales', 'EV sales share', 'EV stock share']
 
-def prepare_data(data):
-    global_sales_data = data[(data['parameter'] == 'EV sales') & (data['region'] == 'World')]
+# Indiziertes Abfrageobjekt (einmal pro Datenstand); gelesen werden nur die historischen
+# Pkw-Zeilen der gezeigten Parameter
+@messung.traced()
+def load_query():
+    return abfrage.query_for('ev_history', parameter=SALE_PARAMETERS, mode='Cars', category='Historical')
+
+@messung.traced()
+def prepare_data(query):
+    global_sales_data = query.select(parameter='EV sales', region='World')
     X = global_sales_data['year'].values.reshape(-1, 1)
     y = global_sales_data['value'].values
     return X, y
 
+@messung.traced()
 def train_linear_model_and_predict(X, y):
-    model = LinearRegression()
-    model.fit(X, y)
     future_years = np.array(range(int(X.min()), 2031)).reshape(-1, 1)
-    predictions = model.predict(future_years)
+    model, predictions = prognose.fit_and_predict(LinearRegression, {}, X, y, future_years)
     return future_years.flatten(), predictions
 
+@messung.traced()
 def train_random_forest_and_predict(X, y):  # Neue Funktion für Random Forest
-    rf_model = RandomForestRegressor(n_estimators=200, random_state=42)
-    rf_model.fit(X, y)
     future_years = np.array(range(int(X.min()), 2031)).reshape(-1, 1)
-    predictions_rf = rf_model.predict(future_years)
+    # Trainierte Wälder werden zwischengespeichert; ein neues Training nutzt alle Kerne
+    rf_params = {'n_estimators': 200, 'random_state': 42, 'n_jobs': -1}
+    rf_model, predictions_rf = prognose.fit_and_predict(RandomForestRegressor, rf_params, X, y, future_years)
     return future_years.flatten(), predictions_rf
 
+# Prognosetabelle je Stand der Quelldatei; nach einer neuen IEA-Veröffentlichung werden
+# nur die geänderten Regionen neu berechnet. Die Random-Forest-Prognosen aller Reihen
+# (Prozesspool) werden beim Aufwärmen bzw. in der Vorberechnung erstellt, sonst im
+# Hintergrund, sobald die Seite sie anfordert (forecasts_rf_if_ready).
+@messung.traced_cache(st.cache_resource)
+def load_forecasts(version, random_forest=False):
+    return prognose.load_forecast_table('ev_history', parameter='EV sales', random_forest=random_forest)
+
+_rf_threads = {}
+_rf_lock = threading.Lock()
+
+
+# Random-Forest-Prognosetabelle ohne Wartezeit für die Seite: liegt sie bereits vor, wird sie
+# geladen; sonst wird sie einmal im Hintergrund berechnet (oder vom Aufwärmen übernommen,
+# das über die Sperre von load_forecasts wartet) und None geliefert
+def forecasts_rf_if_ready(version):
+    if prognose.has_forecast_table('ev_history', 'EV sales', random_forest=True):
+        return load_forecasts(version, True)
+    with _rf_lock:
+        thread = _rf_threads.get(version)
+        if thread is not None and not thread.is_alive() and daten.pyarrow is None:
+            # Ohne pyarrow liegt die Tabelle nur im Zwischenspeicher von load_forecasts
+            return load_forecasts(version, True)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=load_forecasts, args=(version, True), name='prognose-rf', daemon=True)
+            _rf_threads[version] = thread
+            thread.start()
+    return None
+
+@messung.traced()
+def plot_regional_forecast(query, forecasts):
+    # Auswahl von Region und Antriebsart aus der gemeinsamen Prognosetabelle
+    regions = sorted(forecasts['region'].unique())
+    selected_region = st.selectbox("Bitte wählen Sie eine Region für die Prognose aus:", regions,
+                                   index=regions.index('World') if 'World' in regions else 0)
+    powertrains = sorted(forecasts.loc[forecasts['region'] == selected_region, 'powertrain'].unique())
+    selected_powertrain = st.selectbox("Bitte wählen Sie den Antriebstyp für die Prognose aus:", powertrains)
+
+    forecast = prognose.forecast_for(forecasts, selected_region, selected_powertrain)
+    forecast_rf = prognose.forecast_for(forecasts, selected_region, selected_powertrain, model='Random Forest')
+    history = query.select(parameter='EV sales', region=selected_region, powertrain=selected_powertrain)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=history['year'], y=history['value'], mode='markers', name='Historische Daten'))
+    fig.add_trace(go.Scatter(x=forecast['year'], y=forecast['value'], mode='lines', name='Lineare Regression', line=dict(color='red')))
+    if len(forecast_rf):
+        fig.add_trace(go.Scatter(x=forecast_rf['year'], y=forecast_rf['value'], mode='lines', name='Random Forest', line=dict(color='green')))
+    fig.update_layout(title=f'Prognose für den Verkauf von Elektrofahrzeugen: {selected_region} - {selected_powertrain}',
+                      xaxis_title='Jahr',
+                      yaxis_title='Der Verkauf von Elektrofahrzeugen.',
+                      legend_title='Modell')
+    return fig
+
+@messung.traced()
 def plot_global_forecast(years, predictions_linear, predictions_rf):
     fig = go.Figure()
     
@@ -64,9 +129,8 @@ def plot_global_forecast(years, predictions_linear, predictions_rf):
     return fig
 
 
-def plot_interactive_forecast_by_powertrain(data):
-    # Filterung der Daten nur für 'EV sales'
-    filtered_data = data[data['parameter'] == 'EV sales']
+@messung.traced()
+def plot_interactive_forecast_by_powertrain(query):
 
     # Initialisierung der Grafik
     fig = go.Figure()
@@ -75,21 +139,33 @@ def plot_interactive_forecast_by_powertrain(data):
     powertrains = ['BEV', 'PHEV']  # Annahme basierend auf verfügbaren Antriebstypen
     selected_powertrain = st.selectbox("Bitte wählen Sie den Antriebstyp aus:", ['Alle'] + powertrains)
 
+    # Sichtbarer Zeitraum; je kleiner der Ausschnitt, desto mehr Punkte je Reihe bleiben erhalten
+    sales = query.select(parameter='EV sales')
+    min_year, max_year = int(sales['year'].min()), int(sales['year'].max())
+    year_range = st.slider("Zeitraum:", min_year, max_year, (min_year, max_year)) if min_year < max_year else (min_year, max_year)
+
     # Füge eine Linie für globale Daten hinzu, wenn 'Alle' ausgewählt ist
     if selected_powertrain == 'Alle':
         for powertrain in powertrains:
-            pt_data = filtered_data[(filtered_data['region'] == 'World') & (filtered_data['powertrain'] == powertrain)]
-            fig.add_trace(go.Scatter(x=pt_data['year'], y=pt_data['value'], name=powertrain,
-                                     mode='lines+markers', line=dict(width=2)))
+            pt_data = query.select(parameter='EV sales', region='World', powertrain=powertrain)
+            fig.add_trace(darstellung.line_trace(pt_data['year'], pt_data['value'], visible_range=year_range, name=powertrain,
+                                                 mode='lines+markers', line=dict(width=2)))
 
     # Füge Linien für ausgewählte Regionen und Antriebstypen hinzu
     else:
-        filtered_data = filtered_data[filtered_data['powertrain'] == selected_powertrain]
-        regions = filtered_data['region'].unique()
+        regions = query.select(parameter='EV sales', powertrain=selected_powertrain)['region'].unique()
+        series = {}
         for region in regions:
-            region_data = filtered_data[filtered_data['region'] == region]
-            fig.add_trace(go.Scatter(x=region_data['year'], y=region_data['value'], name=f"{region} - {selected_powertrain}",
-                                     mode='lines+markers', line=dict(width=2), visible='legendonly'))
+            region_data = query.select(parameter='EV sales', region=region, powertrain=selected_powertrain)
+            series[f"{region} - {selected_powertrain}"] = (region_data['year'], region_data['value'])
+        if len(series) > darstellung.PACK_THRESHOLD:
+            # Sehr viele Regionen: ein gemeinsamer Trace statt eines Traces je Region
+            fig.add_trace(darstellung.packed_line_trace(series, visible_range=year_range, name=selected_powertrain,
+                                                        mode='lines+markers', line=dict(width=1)))
+        else:
+            for name, (x, y) in series.items():
+                fig.add_trace(darstellung.line_trace(x, y, visible_range=year_range, name=name,
+                                                     mode='lines+markers', line=dict(width=2), visible='legendonly'))
 
     # Aktualisiere das Layout des Diagramms
     fig.update_layout(
@@ -104,14 +180,11 @@ def plot_interactive_forecast_by_powertrain(data):
     return fig
 
 
-def plot_market_shares(data):
+@messung.traced()
+def plot_market_shares(query):
     # Definition von Interessensregionen
     regions_of_interest = ['World', 'China', 'USA', 'Europe', 'Germany']
     
-    # Filterung von Daten für EV-Verkaufsanteil und EV-Bestandsanteil
-    ev_sales_share = data[(data['parameter'] == 'EV sales share') & data['region'].isin(regions_of_interest)]
-    ev_stock_share = data[(data['parameter'] == 'EV stock share') & data['region'].isin(regions_of_interest)]
-    
     fig, ax = plt.subplots(1, 2, figsize=(14, 6))
     
     # Festlegen von Farben/Regionen für bessere Visualisierung
@@ -119,7 +192,7 @@ def plot_market_shares(data):
     
     # Diagramm für den EV-Verkaufsanteil
     for region in regions_of_interest:
-        region_data = ev_sales_share[ev_sales_share['region'] == region]
+        region_data = query.select(parameter='EV sales share', region=region)
         ax[0].plot(region_data['year'], region_data['value'], marker='o', linestyle='-', color=colors[region], label=region)
     ax[0].set_title('Prozentsatz der Verkäufe von EV')
     ax[0].set_xlabel('Jahr')
@@ -129,7 +202,7 @@ def plot_market_shares(data):
 
     # Diagramm für den EV-Bestandsanteil
     for region in regions_of_interest:
-        region_data = ev_stock_share[ev_stock_share['region'] == region]
+        region_data = query.select(parameter='EV stock share', region=region)
         ax[1].plot(region_data['year'], region_data['value'], marker='o', linestyle='-', color=colors[region], label=region)
     ax[1].set_title('Anteil von EV am Gesamtverkauf')
     ax[1].set_xlabel('Jahr')
@@ -140,20 +213,47 @@ def plot_market_shares(data):
     return fig
 
 
+# Fragmente: eine Änderung der Auswahl in einem Fragment führt nur dieses Fragment
+# erneut aus, nicht die ganze Seite (Marktanteile und Modelle bleiben unberührt)
+@st.fragment
+def show_interactive_forecast_by_powertrain(query):
+    fig_interactive = plot_interactive_forecast_by_powertrain(query)
+    st.plotly_chart(fig_interactive)
+
+
+# Wartet auf die im Hintergrund berechnete Random-Forest-Prognose und lädt danach die Seite neu
+@st.fragment(run_every=5)
+def _wait_for_forecasts_rf(version):
+    if forecasts_rf_if_ready(version) is not None:
+        st.rerun()
+    st.info('Die Random-Forest-Prognose wird im Hintergrund berechnet und erscheint, sobald sie vorliegt. '
+            'Bis dahin wird die lineare Prognose gezeigt.')
+
+
+@st.fragment
+def show_regional_forecast(query, version):
+    forecasts = None
+    if st.checkbox('Random-Forest-Prognose anzeigen'):
+        forecasts = forecasts_rf_if_ready(version)
+        if forecasts is None:
+            _wait_for_forecasts_rf(version)
+    fig_regional = plot_regional_forecast(query, forecasts if forecasts is not None else load_forecasts(version))
+    st.plotly_chart(fig_regional)
+
+
 def app():
-    data = load_data()
-    X, y = prepare_data(data)
+    query = load_query()
+    X, y = prepare_data(query)
     
     st.write("## Marktanalyse für Elektrofahrzeuge")
 
-    # Diagramme für Marktanteile
-    fig1 = plot_market_shares(data)
-    st.pyplot(fig1)
+    # Diagramme für Marktanteile (einmal pro Datenstand gerastert)
+    version = daten.content_hash(daten.IEA_DATEIEN['ev_history'])
+    st.image(abbildungen.cached_figure(plot_market_shares, version, query))
     
     # Interaktive Grafik des jährlichen Verkaufs von Elektrofahrzeugen nach Regionen
     st.write("## Der interaktive Graph der jährlichen Verkaufszahlen von Elektrofahrzeugen nach Regionen.")
-    fig_interactive = plot_interactive_forecast_by_powertrain(data)
-    st.plotly_chart(fig_interactive)
+    show_interactive_forecast_by_powertrain(query)
     st.write("""
     Das interaktive Diagramm erlaubt den Benutzern, den jährlichen Verkauf von Elektroautos genauer zu untersuchen, indem sie einen bestimmten Antriebstyp (BEV oder PHEV) wählen und die Verkaufstrends in verschiedenen Regionen vergleichen. Eine solche Analyse kann dabei helfen, wichtige Märkte für die Erweiterung und Entwicklung neuer Antriebstechnologien zu identifizieren.
 
@@ -180,6 +280,10 @@ def app():
 
 """)
 
+    # Prognosen für alle Regionen und Antriebsarten aus einem gemeinsamen Rechenschritt
+    st.write("## Die Prognose nach Region und Antriebsart.")
+    show_regional_forecast(query, version)
+
 
 if __name__ == "__main__":
     app()
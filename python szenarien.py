@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import daten
+import messung
+import wuerfel
+
+# Datensätze des Würfels, die in die Szenarioachse eingehen. Die Szenarien sind die
+# IEA-Kategorien ('Historical', 'Projection-STEPS', 'Projection-APS'); eine neue
+# Projektionsdatei ist ein weiterer Name hier und damit eine weitere Scheibe der Achse.
+DATASETS = ['ev_history', 'charging_points_historical', 'ev_sales_steps', 'ev_sales_aps', 'charging_points_steps']
+
+# Historische Reihe und Bezugsszenario für die Differenzen
+HISTORICAL = 'Historical'
+REFERENCE = 'Projection-STEPS'
+
+# Verkehrsträger: Pkw für Fahrzeuge und Strom, 'EV' für Ladepunkte
+MODES = ['Cars', 'EV']
+
+# Kennzahlen je Zelle: Wert, Differenz zum Bezugsszenario, jährliche Wachstumsrate
+# (geometrisch über Lücken zwischen Stützjahren) und die fortgeschriebene Reihe
+# (historisch bis zum letzten historischen Jahr, danach das Szenario)
+KINDS = ['value', 'delta', 'growth', 'stitched']
+
+
+# Jährliche Wachstumsrate gegenüber dem letzten vorhandenen Jahr entlang der Jahresachse (Achse 1)
+def growth_rates(values, years):
+    n_years = values.shape[1]
+    valid = ~np.isnan(values)
+    positions = np.arange(n_years).reshape(1, -1, *([1] * (values.ndim - 2)))
+    last = np.maximum.accumulate(np.where(valid, positions, -1), axis=1)
+    previous = np.concatenate([np.full_like(last[:, :1], -1), last[:, :-1]], axis=1)
+    has_previous = valid & (previous >= 0)
+    base = np.take_along_axis(values, np.maximum(previous, 0), axis=1)
+    span = years[np.arange(n_years)].reshape(positions.shape) - years[np.maximum(previous, 0)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.power(values / base, 1.0 / span) - 1.0
+    return np.where(has_previous & (base > 0) & (values >= 0), rates, np.nan)
+
+
+# Übergang von der historischen Reihe in jedes Szenario: Ankerjahr (letztes historisches Jahr),
+# historischer Wert und Szenariowert im Ankerjahr sowie die fortgeschriebene Reihe
+def continuity(values, historical):
+    n_years = values.shape[1]
+    history = values[..., historical]
+    valid = ~np.isnan(history)
+    anchor = np.where(valid.any(axis=1), n_years - 1 - np.argmax(valid[:, ::-1], axis=1), -1)
+    index = np.maximum(anchor, 0)[:, None, :]
+    anchor_history = np.take_along_axis(history, index, axis=1)[:, 0]
+    anchor_values = np.take_along_axis(values, index[..., None], axis=1)[:, 0]
+    anchor_values[anchor < 0] = np.nan
+
+    after_anchor = np.arange(n_years)[None, :, None] > anchor[:, None, :]
+    stitched = np.where(after_anchor[..., None], values, history[..., None])
+    return anchor, anchor_history, anchor_values, stitched
+
+
+# Ausgerichtetes Feld Region × Jahr × Parameter × Szenario über allen Szenario-Datensätzen.
+# Alle abgeleiteten Kennzahlen werden beim Aufbau in einem Durchgang über das ganze Feld berechnet.
+class ScenarioEngine:
+    def __init__(self, data):
+        frame = data.groupby(['region', 'year', 'parameter', 'category'], observed=True)['sum'].sum().reset_index()
+        self.regions = np.array(sorted(frame['region'].unique()), dtype=object)
+        self.parameters = np.array(sorted(frame['parameter'].unique()), dtype=object)
+        self.scenarios = np.array(sorted(frame['category'].unique(), key=lambda c: (c != HISTORICAL, c)), dtype=object)
+        first_year, last_year = (int(frame['year'].min()), int(frame['year'].max())) if len(frame) else (0, -1)
+        self.years = np.arange(first_year, last_year + 1)
+
+        self.values = np.full((len(self.regions), len(self.years), len(self.parameters), len(self.scenarios)), np.nan)
+        self.values[self._codes(self.regions, frame['region']), frame['year'].to_numpy(dtype=int) - first_year,
+                    self._codes(self.parameters, frame['parameter']), self._codes(self.scenarios, frame['category'])] = frame['sum'].to_numpy(dtype=float)
+
+        historical = self.scenario_index(HISTORICAL)
+        reference = self.scenario_index(REFERENCE)
+        self.growth = growth_rates(self.values, self.years)
+        self.delta = self.values - self.values[..., [reference]] if reference is not None else np.full_like(self.values, np.nan)
+        if historical is not None:
+            self.anchor, self.anchor_history, self.anchor_values, self.stitched = continuity(self.values, historical)
+        else:
+            self.anchor = np.full((len(self.regions), len(self.parameters)), -1)
+            self.anchor_history = np.full(self.anchor.shape, np.nan)
+            self.anchor_values = np.full(self.anchor.shape + (len(self.scenarios),), np.nan)
+            self.stitched = self.values
+
+    @staticmethod
+    def _codes(labels, column):
+        return np.searchsorted(labels, np.asarray(column, dtype=object))
+
+    def scenario_index(self, scenario):
+        positions = np.flatnonzero(self.scenarios == scenario)
+        return int(positions[0]) if len(positions) else None
+
+    def _positions(self, labels, selection):
+        if selection is None:
+            return np.arange(len(labels))
+        selection = [selection] if isinstance(selection, str) else list(selection)
+        return np.flatnonzero(np.isin(labels, selection))
+
+    def _parameter_index(self, parameter):
+        positions = np.flatnonzero(self.parameters == parameter)
+        if not len(positions):
+            raise KeyError(f'Unbekannter Parameter: {parameter}')
+        return int(positions[0])
+
+    def _projections(self):
+        return [s for s in range(len(self.scenarios)) if self.scenarios[s] != HISTORICAL]
+
+    # Regionen mit Werten eines Parameters in mindestens einem Projektionsszenario
+    def projection_regions(self, parameter):
+        p = self._parameter_index(parameter)
+        present = ~np.isnan(self.values[:, :, p][..., self._projections()]).all(axis=(1, 2))
+        return self.regions[present].tolist()
+
+    # Kennzahl (KINDS) eines Parameters im Langformat (region, year, scenario, value), ohne Lücken
+    def series(self, parameter, region=None, scenario=None, kind='value', years=None):
+        if kind not in KINDS:
+            raise KeyError(f'Unbekannte Kennzahl: {kind}')
+        values = getattr(self, {'value': 'values'}.get(kind, kind))
+        r = self._positions(self.regions, region)
+        p = self._parameter_index(parameter)
+        s = self._positions(self.scenarios, scenario)
+        y = np.arange(len(self.years))
+        if years is not None:
+            low, high = years
+            y = y[(self.years >= (self.years[0] if low is None else low)) & (self.years <= (self.years[-1] if high is None else high))]
+        block = values[np.ix_(r, y, [p], s)][:, :, 0, :]
+        grid = np.meshgrid(r, y, s, indexing='ij')
+        present = ~np.isnan(block)
+        return pd.DataFrame({
+            'region': self.regions[grid[0][present]],
+            'year': self.years[grid[1][present]],
+            'scenario': self.scenarios[grid[2][present]],
+            'value': block[present],
+        })
+
+    # Übergang historisch → Szenario je Region: Ankerjahr, beide Werte und relative Abweichung
+    def continuity_table(self, parameter, region=None):
+        r = self._positions(self.regions, region)
+        p = self._parameter_index(parameter)
+        projections = self._projections()
+        anchor = self.anchor[r, p]
+        rows = {
+            'region': np.repeat(self.regions[r], len(projections)),
+            'scenario': np.tile(self.scenarios[projections], len(r)),
+            'anchor_year': np.repeat(np.where(anchor >= 0, self.years[np.maximum(anchor, 0)], -1), len(projections)),
+            'historical': np.repeat(self.anchor_history[r, p], len(projections)),
+            'projection': self.anchor_values[r, p][:, projections].ravel(),
+        }
+        table = pd.DataFrame(rows)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table['gap'] = table['projection'] / table['historical'] - 1.0
+        return table[table['anchor_year'] >= 0].dropna(subset=['projection']).reset_index(drop=True)
+
+
+# Summen je Region, Jahr, Parameter und Kategorie aus dem Aggregatwürfel (über alle Antriebsarten)
+def scenario_rows(cube):
+    rows = cube.select(dataset=DATASETS)
+    keep = (rows['powertrain'] == wuerfel.TOTAL) & (rows['region'] != wuerfel.TOTAL) & rows['mode'].isin(MODES)
+    return rows.loc[keep, ['region', 'year', 'parameter', 'category', 'sum']]
+
+
+@messung.traced_cache(st.cache_resource)
+def _load_engine(version):
+    return ScenarioEngine(scenario_rows(wuerfel.cube_query()))
+
+
+# Szenario-Engine des aktuellen Datenstands (einmal pro Prozess, von allen Sitzungen geteilt)
+def load_engine():
+    return _load_engine(daten.dataset_version(daten.IEA_DATEIEN))
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+# Lineare Regression y = slope * x + intercept in geschlossener Form, für eine oder
+# viele Gruppen gleichzeitig. Die Summen je Gruppe entstehen mit np.bincount; gerechnet
+# wird auf den um den Gruppenmittelwert zentrierten Werten (numerisch stabiler).
+# Ergebnis: eine Zeile je Gruppe mit n, slope, intercept, r2, pearson_r, x_min, x_max.
+def linear_fit(x, y, groups=None):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.isfinite(x) & np.isfinite(y)
+    if groups is None:
+        codes, labels = np.zeros(len(x), dtype=np.intp), pd.Index([None])
+    else:
+        codes, labels = pd.factorize(np.asarray(groups))
+        labels = pd.Index(labels)
+        valid &= codes >= 0
+    x, y, codes = x[valid], y[valid], codes[valid]
+    size = len(labels)
+
+    n = np.bincount(codes, minlength=size).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = np.bincount(codes, weights=x, minlength=size) / n
+        mean_y = np.bincount(codes, weights=y, minlength=size) / n
+        dx = x - mean_x[codes]
+        dy = y - mean_y[codes]
+        sxx = np.bincount(codes, weights=dx * dx, minlength=size)
+        syy = np.bincount(codes, weights=dy * dy, minlength=size)
+        sxy = np.bincount(codes, weights=dx * dy, minlength=size)
+
+        slope = sxy / sxx
+        intercept = mean_y - slope * mean_x
+        pearson_r = sxy / np.sqrt(sxx * syy)
+
+    return pd.DataFrame({
+        'group': labels,
+        'n': n.astype(np.int64),
+        'slope': slope,
+        'intercept': intercept,
+        'r2': pearson_r ** 2,
+        'pearson_r': pearson_r,
+        'x_min': _group_extreme(x, codes, size, np.minimum, np.inf),
+        'x_max': _group_extreme(x, codes, size, np.maximum, -np.inf),
+    })
+
+
+def _group_extreme(x, codes, size, ufunc, start):
+    result = np.full(size, start)
+    ufunc.at(result, codes, x)
+    return result
+
+
+# Zeichnet die Trendlinien (eine je Gruppe) als Linien-Traces in eine bestehende Abbildung
+# und liefert die Kennzahlen aus linear_fit zurück
+def add_trendline(fig, x, y, groups=None, name='OLS-Trend', color='red'):
+    fit = linear_fit(x, y, groups)
+    for row in fit[np.isfinite(fit['slope'])].itertuples(index=False):
+        line_x = np.array([row.x_min, row.x_max])
+        label = name if groups is None else f'{name}: {row.group}'
+        fig.add_trace(go.Scatter(x=line_x, y=row.intercept + row.slope * line_x, mode='lines',
+                                 name=f'{label} (R² = {row.r2:.2f})',
+                                 line=dict(color=color) if groups is None else None,
+                                 hovertemplate=f'y = {row.slope:.4g}·x + {row.intercept:.4g}<br>R² = {row.r2:.3f}<extra></extra>'))
+    return fit
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import daten
+import messung
+import wuerfel
+
+# Kennzahlen des Verknüpfungsindex: Name → (Datensätze, Parameter, Kennzahl des Würfels).
+# Summiert wird je (region, year) über alle Antriebsarten. Die Datensätze stehen in der
+# Reihenfolge ihres Vorrangs: je Schlüssel zählt der erste mit Werten (z. B. historische vor
+# prognostizierten Ladepunkten in den Überschneidungsjahren), damit nichts doppelt eingeht.
+# Eine weitere IEA-Kennzahl ist ein weiterer Eintrag hier und kostet keine weitere Verknüpfung.
+INDICATORS = {
+    'sales': (['ev_history'], 'EV sales', 'sum'),
+    'stock': (['electricity_demand_historical'], 'EV stock', 'sum'),
+    'chargers': (['charging_points_historical', 'charging_points_steps'], 'EV charging points', 'sum'),
+    'demand': (['electricity_demand_steps'], 'Electricity demand', 'mean'),
+}
+
+
+# Gemeinsamer Index über (region, year): jeder Schlüssel hat einmal einen ganzzahligen Code
+# (Regionscode × Anzahl Jahre + Jahresversatz), alle Kennzahlen liegen als daran ausgerichtete
+# Spalten vor (NaN, wo ein Datensatz keinen Wert hat). Verknüpfungen zwischen Kennzahlen sind
+# damit Masken über denselben Positionen statt Merges über Textschlüssel.
+class JoinIndex:
+    def __init__(self, regions, years):
+        self.regions = pd.Index(regions)
+        # Jahre im Typ der Quelle (im kompakten Schema int16)
+        self.years = np.arange(int(years[0]), int(years[-1]) + 1).astype(np.asarray(years).dtype)
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.regions) * len(self.years)
+
+    # Codes der Schlüssel einer Tabelle; -1 für Regionen oder Jahre außerhalb des Index
+    def codes(self, regions, years):
+        if isinstance(regions.dtype, pd.CategoricalDtype) and regions.cat.categories.equals(self.regions):
+            region_codes = regions.cat.codes.to_numpy()
+        else:
+            region_codes = self.regions.get_indexer(np.asarray(regions, dtype=object))
+        offsets = np.asarray(years, dtype=np.int64) - self.years[0]
+        valid = (region_codes >= 0) & (offsets >= 0) & (offsets < len(self.years))
+        return np.where(valid, region_codes.astype(np.int64) * len(self.years) + offsets, -1)
+
+    # Fügt eine Kennzahl als ausgerichtete Spalte hinzu; mehrere Zeilen je Schlüssel werden summiert
+    def add(self, name, regions, years, values):
+        codes = self.codes(regions, years)
+        values = np.asarray(values, dtype=np.float64)
+        keep = codes >= 0
+        column = np.bincount(codes[keep], weights=values[keep], minlength=len(self))
+        present = np.bincount(codes[keep], minlength=len(self)) > 0
+        self.columns[name] = np.where(present, column, np.nan)
+
+    # Positionen, an denen alle angegebenen Kennzahlen vorhanden sind (innere Verknüpfung)
+    def positions(self, names, region=None, years=None):
+        mask = np.ones(len(self), dtype=bool)
+        for name in names:
+            mask &= ~np.isnan(self.columns[name])
+        if region is not None:
+            region_codes = self.regions.get_indexer([region] if isinstance(region, str) else list(region))
+            mask &= np.isin(np.arange(len(self)) // len(self.years), region_codes[region_codes >= 0])
+        if years is not None:
+            low, high = years
+            year_values = self.years[np.arange(len(self)) % len(self.years)]
+            if low is not None:
+                mask &= year_values >= low
+            if high is not None:
+                mask &= year_values <= high
+        return np.flatnonzero(mask)
+
+    # Werte der Kennzahlen an gemeinsamen Schlüsseln, z. B. für Korrelationen: ein Feld je Name
+    def values(self, names, region=None, years=None):
+        positions = self.positions(names, region, years)
+        return [self.columns[name][positions] for name in names]
+
+    # Tabelle (region, year, Kennzahlen...) an gemeinsamen Schlüsseln, nach Region und Jahr sortiert
+    def frame(self, names, region=None, years=None):
+        positions = self.positions(names, region, years)
+        data = {
+            'region': pd.Categorical.from_codes(positions // len(self.years), categories=self.regions),
+            'year': self.years[positions % len(self.years)],
+        }
+        data.update({name: self.columns[name][positions] for name in names})
+        return pd.DataFrame(data)
+
+
+# Baut den Index über dem Aggregatwürfel; die Regionscodes sind die Kategorien des Würfels
+def build_index(cube, indicators=INDICATORS):
+    data = cube.data
+    regions = data['region'].cat.categories if isinstance(data['region'].dtype, pd.CategoricalDtype) else sorted(data['region'].unique())
+    index = JoinIndex(regions, (data['year'].min(), data['year'].max()))
+    for name, (datasets, parameter, aggregate) in indicators.items():
+        column = None
+        for dataset in datasets:
+            rows = cube.select(dataset=dataset, parameter=parameter)
+            rows = rows[(rows['powertrain'] == wuerfel.TOTAL) & (rows['region'] != wuerfel.TOTAL)]
+            index.add(name, rows['region'], rows['year'], rows[aggregate])
+            column = index.columns[name] if column is None else np.where(np.isnan(column), index.columns[name], column)
+        index.columns[name] = column
+    return index
+
+
+@messung.traced_cache(st.cache_resource)
+def _load_index(version):
+    return build_index(wuerfel.cube_query())
+
+
+# Verknüpfungsindex des aktuellen Datenstands (einmal pro Prozess, von allen Sitzungen geteilt)
+def load_index():
+    return _load_index(daten.dataset_version(daten.IEA_DATEIEN))
@@ -0,0 +1,166 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import daten
+import messung
+
+# Module, deren Code die Artefakte bestimmt; ändert sich einer davon, ist das Bündel ungültig
+CODE_MODULES = ['daten', 'abfrage', 'aktualisierung', 'wuerfel', 'prognose', 'fahrzeuge', 'abbildungen',
+                'verknuepfung', 'sale', 'energie', 'ladestation']
+
+# Anzahl älterer Bündelversionen, die neben der aktuellen erhalten bleiben
+KEEP_VERSIONS = 2
+
+
+# Version eines Bündels aus den Inhalts-Hashes der Quelldateien und des Codes
+def bundle_version(sources, code):
+    digest = hashlib.sha256(json.dumps([sources, code], sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def _sale_version():
+    return daten.content_hash(daten.IEA_DATEIEN['ev_history'])
+
+
+# Zwischenspeicher: typisierte Schnappschüsse, kompaktes Wörterbuch, Würfel, Prognosetabelle
+# und trainierte Modelle landen im Verzeichnis 'cache' des Bündels
+def _warm_cache():
+    import fahrzeuge
+    import sale
+    import wuerfel
+
+    steps = [(f'iea:{name}', lambda name=name: daten.load_iea(name)) for name in daten.IEA_DATEIEN]
+    steps += [(f'fahrzeuge:{name}', lambda name=name: fahrzeuge.load_vehicles(name)) for name in daten.SPEC_DATEIEN]
+    steps += [
+        ('woerterbuch', daten.label_dictionary),
+        ('wuerfel', wuerfel.cube_query),
+        ('sale:prognosen', lambda: sale.load_forecasts(_sale_version())),
+        ('sale:prognosen_rf', lambda: sale.load_forecasts(_sale_version(), True)),
+        ('sale:modelle', lambda: _sale_models(sale)),
+    ]
+    return steps
+
+
+def _sale_models(sale):
+    X, y = sale.prepare_data(sale.load_query())
+    sale.train_linear_model_and_predict(X, y)
+    sale.train_random_forest_and_predict(X, y)
+
+
+# Tabellen, die die Seiten über daten.artifact laden: {Name: Funktion, die sie berechnet}
+def artifact_builders():
+    import energie
+    import ladestation
+
+    return {
+        'ladestation': ladestation.build_data,
+        'energie': energie.build_data,
+    }
+
+
+# Statische Abbildungen, die über abbildungen.cached_figure vorab gerastert werden
+def _render_figures():
+    import abbildungen
+    import sale
+
+    abbildungen.cached_figure(sale.plot_market_shares, _sale_version(), sale.load_query())
+
+
+def _timed(log, name, function):
+    start = time.perf_counter()
+    with messung.span(f'vorberechnung.{name}'):
+        result = function()
+    log(f'{name}: {time.perf_counter() - start:.2f} s')
+    return result
+
+
+# Baut ein vollständiges Bündel in output/<Version> und setzt output/aktuell darauf.
+# Existiert die Version schon, bleibt sie unverändert (außer mit force).
+def build(output=daten.BUNDLE_DIR, keep=KEEP_VERSIONS, force=False, log=print):
+    import abbildungen
+    import prognose
+
+    sources = daten.bundle_sources()
+    code = daten.code_hashes(CODE_MODULES)
+    version = bundle_version(sources, code)
+    directory = os.path.join(output, version)
+    if os.path.exists(os.path.join(directory, 'manifest.json')) and not force:
+        log(f'Bündel {version} ist aktuell')
+        _set_current(output, version)
+        return directory
+
+    tmp_directory = f'{directory}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    # Alle Zwischenspeicher direkt ins Bündel schreiben; ein älteres Bündel wird dabei nicht verwendet
+    daten.BUNDLE_DIR = ''
+    daten.CACHE_DIR = os.path.join(tmp_directory, 'cache')
+    prognose.MODEL_DIR = os.path.join(daten.CACHE_DIR, 'modelle')
+
+    start = time.perf_counter()
+    for name, function in _warm_cache():
+        _timed(log, name, function)
+    artifacts = {}
+    for name, function in artifact_builders().items():
+        artifacts[name] = daten.write_artifact(tmp_directory, name, _timed(log, name, function))
+    _timed(log, 'abbildungen', _render_figures)
+    figures = []
+    os.makedirs(os.path.join(tmp_directory, 'abbildungen'), exist_ok=True)
+    for key, png in abbildungen.cached_items():
+        figures.append({'function': key[0], 'version': key[1], 'file': abbildungen.figure_name(key)})
+        with open(os.path.join(tmp_directory, 'abbildungen', figures[-1]['file']), 'wb') as f:
+            f.write(png)
+
+    manifest = {
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'seconds': round(time.perf_counter() - start, 2),
+        'sources': sources,
+        'code': code,
+        'artifacts': artifacts,
+        'figures': figures,
+    }
+    with open(os.path.join(tmp_directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    _set_current(output, version)
+    _prune(output, version, keep)
+    log(f'Bündel {version} in {directory} ({manifest["seconds"]} s)')
+    return directory
+
+
+def _set_current(output, version):
+    tmp_path = os.path.join(output, f'aktuell.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(output, 'aktuell'))
+
+
+# Entfernt ältere Bündelversionen bis auf die keep jüngsten
+def _prune(output, version, keep):
+    older = [path for path in glob.glob(os.path.join(output, '*', 'manifest.json'))
+             if os.path.basename(os.path.dirname(path)) != version]
+    older.sort(key=os.path.getmtime, reverse=True)
+    for path in older[keep:]:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Vorberechnung: versioniertes Artefaktbündel für einen schnellen Start')
+    parser.add_argument('--output', default=daten.BUNDLE_DIR or 'artefakte', help='Zielverzeichnis der Bündel')
+    parser.add_argument('--keep', type=int, default=KEEP_VERSIONS, help='ältere Versionen, die erhalten bleiben')
+    parser.add_argument('--force', action='store_true', help='auch eine bereits vorhandene Version neu bauen')
+    args = parser.parse_args(argv)
+
+    build(args.output, args.keep, args.force, log=lambda message: print(message, file=sys.stderr))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import abfrage
+import aktualisierung
+import daten
+import messung
+
+# Dimensionen des Aggregatwürfels; 'dataset' ist der logische Name der Quelldatei
+DIMENSIONS = ['dataset', 'parameter', 'mode', 'powertrain', 'region', 'category', 'year']
+
+# Bezeichnung der Summenzeilen über alle Regionen bzw. alle Antriebsarten.
+# Die IEA-eigene Region 'World' bleibt als eigene Region erhalten.
+TOTAL = daten.TOTAL
+
+# IEA-Regionen, die selbst Summen über andere Regionen sind. Die Summenzeile über alle Regionen
+# übernimmt die Zeilen von 'World', wo der Datensatz sie enthält; sonst ist sie die Summe der
+# einzelnen Länder. Aggregatregionen werden nie mitgezählt, damit nichts doppelt eingeht.
+WORLD = 'World'
+AGGREGATE_REGIONS = [WORLD, 'Europe', 'EU27', 'Other Europe', 'Rest of the world']
+
+# Additive Kennzahlen je Zeile des Würfels; 'rows' ist die Anzahl der Quellzeilen
+AGGREGATES = ['sum', 'count', 'rows']
+
+
+# Format des gespeicherten Würfels; wird erhöht, wenn sich die Berechnung ändert,
+# damit gespeicherte Würfel älterer Formate nicht mehr gelesen werden
+CUBE_FORMAT = 2
+
+
+def _cube_path(version, cube_format=CUBE_FORMAT):
+    return os.path.join(daten.CACHE_DIR, f'wuerfel-v{cube_format}-{version}{daten.CACHE_SUFFIX}')
+
+
+# Zu jedem gespeicherten Würfel gehört ein Manifest {logischer Name: Inhalts-Hash}
+def _manifest_path(cube_path):
+    return cube_path[:-len(daten.CACHE_SUFFIX)] + '.json'
+
+
+# Summe, Anzahl und Zeilenzahl je Kombination der Dimensionen (ohne Summenzeilen)
+def _base(frames):
+    frames = [frame.assign(dataset=name) for name, frame in frames.items() if len(frame)]
+    if not frames:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in DIMENSIONS}
+                            | {'sum': pd.Series(dtype='float64'), 'count': pd.Series(dtype='int64'), 'rows': pd.Series(dtype='int64')})
+    rows = pd.concat(frames, ignore_index=True)
+    base = rows.groupby(DIMENSIONS, dropna=False)['value'].agg(['sum', 'count', 'size']).reset_index()
+    return base.rename(columns={'size': 'rows'})
+
+
+def _powertrain_total(data):
+    keep = [d for d in DIMENSIONS if d != 'powertrain']
+    part = data.groupby(keep, dropna=False, observed=True)[AGGREGATES].sum().reset_index()
+    part['powertrain'] = TOTAL
+    return part[DIMENSIONS + AGGREGATES]
+
+
+# Summenzeilen über alle Regionen: die Zeilen von 'World', wo vorhanden, sonst die Summe der Länder
+def _region_total(data):
+    keep = [d for d in DIMENSIONS if d != 'region']
+    world = data.loc[data['region'] == WORLD, keep + AGGREGATES]
+    countries = data[~data['region'].isin(AGGREGATE_REGIONS)]
+    countries = countries.groupby(keep, dropna=False, observed=True)[AGGREGATES].sum().reset_index()
+    part = pd.concat([world, countries], ignore_index=True).drop_duplicates(keep, keep='first')
+    part['region'] = TOTAL
+    return part[DIMENSIONS + AGGREGATES]
+
+
+# Basiszeilen ergänzt um Summenzeilen über alle Antriebsarten, alle Regionen und beides zusammen (unsortiert)
+def _rollups(base):
+    region_total = _region_total(base)
+    return pd.concat([base, _powertrain_total(base), region_total, _powertrain_total(region_total)], ignore_index=True)
+
+
+def _aggregate(frames):
+    return _rollups(_base(frames))
+
+
+# Dimensionen im kompakten Schema: Kategorien aus dem gemeinsamen Wörterbuch, Jahre als int16.
+# Summe und Mittelwert bleiben float64, damit sich beim Aufsummieren keine Rundungsfehler häufen.
+def _compact_dimensions(cube):
+    dimensions = daten.compact(cube[[d for d in DIMENSIONS if d != 'dataset']])
+    for column in dimensions.columns:
+        cube[column] = dimensions[column]
+    cube['dataset'] = cube['dataset'].astype(pd.CategoricalDtype(sorted(daten.IEA_DATEIEN)))
+    return cube
+
+
+def _finish(cube):
+    cube = _compact_dimensions(cube)
+    cube['mean'] = cube['sum'] / cube['count']
+    # In Abfragereihenfolge speichern, damit der Würfel ohne Umsortieren gelesen werden kann
+    return cube.sort_values(DIMENSIONS, kind='stable').reset_index(drop=True)
+
+
+# Summe, Anzahl und Mittelwert je Kombination der Dimensionen einschließlich der Summenzeilen
+@messung.traced()
+def build_cube(frames):
+    return _finish(_aggregate(frames))
+
+
+# Führende Dimensionen, nach denen der sortierte Würfel in zusammenhängende Blöcke zerfällt,
+# und die übrigen Dimensionen einer Summenzeile (ohne region und powertrain)
+BLOCK_DIMENSIONS = ['dataset', 'parameter', 'mode']
+TOTAL_DIMENSIONS = ['category', 'year']
+
+
+# Zeilenbereich [start, stop) eines Blocks (dataset, parameter, mode) im sortierten Würfel;
+# fehlt der Block, ist der Bereich leer und liegt an der Stelle, an der er einzufügen wäre
+def _block_range(cube, key):
+    start, stop = 0, len(cube)
+    for column, value in zip(BLOCK_DIMENSIONS, key):
+        values = cube[column].iloc[start:stop]
+        categories = values.cat.categories
+        # Fehlende Werte stehen in der Sortierung am Ende
+        codes = values.cat.codes.to_numpy()
+        codes = np.where(codes < 0, len(categories), codes)
+        code = len(categories) if pd.isna(value) else categories.searchsorted(value)
+        present = pd.isna(value) or (code < len(categories) and categories[code] == value)
+        low = np.searchsorted(codes, code, 'left')
+        high = np.searchsorted(codes, code, 'right') if present else low
+        start, stop = start + low, start + high
+    return start, stop
+
+
+# Überträgt die Änderungen neuer IEA-Stände auf einen bestehenden Würfel. deltas stammt aus
+# aktualisierung.dataset_deltas; aggregiert werden nur die Zeilen der geänderten Partitionen
+# (neue Zeilen addiert, alte abgezogen). Die Summenzeilen werden nur für die berührten
+# Schlüssel (dataset, parameter, mode, category, year) aus deren Basiszeilen neu gebildet,
+# weil die Regionssumme ('World' oder Länder) nicht additiv ist, und blockweise in den
+# sortierten Würfel eingesetzt; der übrige Würfel wird weder neu aggregiert noch sortiert.
+@messung.traced()
+def update_cube(cube, deltas):
+    new = _base({name: new_rows for name, (_, new_rows, _) in deltas.items()})
+    old = _base({name: old_rows for name, (old_rows, _, _) in deltas.items()})
+    old[AGGREGATES] = -old[AGGREGATES]
+    delta = pd.concat([new, old], ignore_index=True).groupby(DIMENSIONS, dropna=False)[AGGREGATES].sum().reset_index()
+    if not len(delta):
+        return cube
+    delta = _compact_dimensions(delta)
+
+    pieces, position = [], 0
+    for key, block_delta in delta.groupby(BLOCK_DIMENSIONS, dropna=False, observed=True, sort=True):
+        start, stop = _block_range(cube, key)
+        rows = cube.iloc[start:stop]
+        touched = pd.MultiIndex.from_frame(rows[TOTAL_DIMENSIONS]).isin(pd.MultiIndex.from_frame(block_delta[TOTAL_DIMENSIONS]))
+        affected = rows[touched]
+        base = affected.loc[(affected['region'] != TOTAL) & (affected['powertrain'] != TOTAL), DIMENSIONS + AGGREGATES]
+        base = aktualisierung.add_aggregates(base, block_delta[DIMENSIONS + AGGREGATES], DIMENSIONS, AGGREGATES)
+        # Schlüssel ohne Quellzeilen (weggefallene Partitionen) entfernen
+        block = pd.concat([rows.loc[~touched, DIMENSIONS + AGGREGATES], _rollups(base[base['rows'] > 0])], ignore_index=True)
+        pieces += [cube.iloc[position:start], _finish(block)]
+        position = stop
+    pieces.append(cube.iloc[position:])
+
+    result = pd.concat(pieces, ignore_index=True)
+    # Neue Bezeichnungen ändern die Kategorien; dann die Dimensionen einmal neu kodieren
+    if not all(isinstance(result[column].dtype, pd.CategoricalDtype) for column in DIMENSIONS if column != 'year'):
+        result = _compact_dimensions(result)
+    return result
+
+
+# Jüngster gespeicherter Würfel eines anderen Datenstands mit seinem Manifest
+def _previous_cube(path):
+    candidates = [old_path for old_path in glob.glob(_cube_path('*'))
+                  if old_path != path and os.path.exists(_manifest_path(old_path))]
+    if not candidates:
+        return None, None
+    old_path = max(candidates, key=os.path.getmtime)
+    with open(_manifest_path(old_path), encoding='utf-8') as f:
+        manifest = json.load(f)
+    return daten.read_frame(old_path), manifest
+
+
+# Würfel aus dem vorherigen Stand und den geänderten Partitionen; None, wenn kein
+# verwendbarer vorheriger Stand vorhanden ist
+def _incremental_cube(path, registry):
+    previous, manifest = _previous_cube(path)
+    if previous is None or not set(AGGREGATES) <= set(previous.columns):
+        return None
+    # Geänderte Quelldateien einlesen, damit ihr typisierter Bestand im Zwischenspeicher liegt
+    for name in aktualisierung.changed_datasets(manifest, registry):
+        if name in registry:
+            daten.load_iea(name)
+    deltas = aktualisierung.dataset_deltas(manifest, registry)
+    if deltas is None:
+        return None
+    return update_cube(previous, deltas)
+
+
+# Lädt den Würfel des aktuellen Datenstands von der Festplatte. Fehlt er, wird ein älterer
+# Würfel um die geänderten Partitionen fortgeschrieben, sonst einmalig vollständig aufgebaut.
+def load_cube(version):
+    path = _cube_path(version)
+    messung.cache_event('wuerfel.cube', os.path.exists(path))
+    if os.path.exists(path):
+        return daten.read_frame(path)
+
+    registry = daten.iea_registry()
+    cube = _incremental_cube(path, registry) if daten.pyarrow is not None else None
+    if cube is None:
+        cube = build_cube({name: daten.load_iea(name) for name in daten.IEA_DATEIEN})
+    if daten.pyarrow is not None:
+        daten.write_frame(cube, path)
+        with open(_manifest_path(path), 'w', encoding='utf-8') as f:
+            json.dump(registry, f)
+        # Würfel älterer Datenstände und Formate entfernen
+        for old_path in glob.glob(os.path.join(daten.CACHE_DIR, f'wuerfel-*{daten.CACHE_SUFFIX}')):
+            if old_path != path and not old_path.endswith('.tmp'):
+                os.remove(old_path)
+                if os.path.exists(_manifest_path(old_path)):
+                    os.remove(_manifest_path(old_path))
+    return cube
+
+
+@messung.traced_cache(st.cache_resource)
+def _cube_query(version):
+    return abfrage.IEAQuery(load_cube(version), keys=DIMENSIONS)
+
+
+# Abfrageobjekt über dem Würfel, z. B.
+# cube_query().select(dataset='ev_history', parameter='EV sales', mode='Cars', powertrain=TOTAL)
+def cube_query():
+    return _cube_query(daten.dataset_version(daten.IEA_DATEIEN))